@@ -2,17 +2,34 @@
 # Full-featured SkillMod bot with slash commands, autocomplete, embeds.
 # Expects environment variable DISCORD_BOT_TOKEN to be set.
 # Optional: set GUILD_ID (string) to a guild id to register commands instantly there.
+# Optional: set TRACE_FILE to record anonymized interaction traces (see tools/replay.py).
+# To serve the `!` text commands from the same process, run runner.py instead.
 
 import os
 import discord
 from discord import app_commands
 from discord.ext import commands
-from collections import defaultdict
-from math import prod
-from datetime import datetime, timezone
+from collections import defaultdict, deque, OrderedDict
+from math import exp, log1p, prod
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 import asyncio
 import json
+import re
+import time
+import hashlib
+import threading
+import heapq
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from array import array
+
+import numpy as np
+from sortedcontainers import SortedList
+
+from formula import SKILLMOD_FORMULA, compile_formula, skillmod_calculator
+from team_parser import (TeamParseError, UnknownHeroError, build_name_index,
+                         normalize_hero_name, parse_team)
 
 # ---------------------------
 # Hero data (confirmed values)
@@ -35,6 +52,8 @@ HERO_DATA = {
 
 # list for autocomplete
 HERO_NAMES = sorted(HERO_DATA.keys(), key=lambda s: s.lower())
+# lower-case name -> canonical name, used by every parser
+HERO_NAME_INDEX = build_name_index(HERO_DATA)
 
 # ---------------------------
 # Preset management
@@ -81,73 +100,20 @@ def list_user_presets(user_id: str):
 # ---------------------------
 
 
-def compute_factors_from_hero_counts(hero_counts):
-    """
-    hero_counts: dict e.g. {"Chenko": 4, "Amane": 2}
-    Returns per-op sums and final multiplicative factors per category.
-    """
-    per_op = defaultdict(float)  # key: (category, op) -> sum of decimals
-
-    for hero, count in hero_counts.items():
-        if hero not in HERO_DATA:
-            raise KeyError(hero)
-        for (cat, op, pct) in HERO_DATA[hero]:
-            per_op[(cat, op)] += pct * count
-
-    def category_factor(cat_name):
-        factors = []
-        for (cat, op), total_pct in per_op.items():
-            if cat == cat_name:
-                factors.append(1.0 + total_pct)  # (1 + sum_pct_for_this_op)
-        return prod(factors) if factors else 1.0
+# The formula itself is declared in formula.py (shared with main.py) and
+# compiled once against HERO_DATA into a specialized scoring function.
+SKILLMOD_KERNEL = compile_formula(SKILLMOD_FORMULA, HERO_DATA)
 
-    dmg_factor = category_factor("DamageUp")
-    def_factor = category_factor("DefenseUp")
-    opp_def_factor = category_factor("OppDefenseDown")
-    opp_dmg_factor = category_factor("OppDamageDown")
-
-    return {
-        "per_op": per_op,
-        "DamageUpFactor": dmg_factor,
-        "DefenseUpFactor": def_factor,
-        "OppDefenseDownFactor": opp_def_factor,
-        "OppDamageDownFactor": opp_dmg_factor
-    }
+# hero_counts -> dict with SkillMod and user-friendly stats; KeyError on unknown heroes.
+calculate_skillmod = skillmod_calculator(SKILLMOD_KERNEL)
 
 
-def calculate_skillmod(hero_counts):
+def compute_factors_from_hero_counts(hero_counts):
     """
-    Returns a dict with SkillMod and user-friendly stats.
+    hero_counts: dict e.g. {"Chenko": 4, "Amane": 2}
+    Returns per-op sums and final multiplicative factors per category.
     """
-    groups = compute_factors_from_hero_counts(hero_counts)
-    dmg_f = groups["DamageUpFactor"]
-    def_f = groups["DefenseUpFactor"]
-    opp_def_f = groups["OppDefenseDownFactor"]
-    opp_dmg_f = groups["OppDamageDownFactor"]
-
-    # SkillMod per article: (DamageUp * OppDefenseDown) / (OppDamageDown * DefenseUp)
-    # note: we already computed factors as (1 + sums) per-op multiplied across ops
-    # so use them directly:
-    # guard against zero in denominator
-    denom = opp_dmg_f * def_f if (opp_dmg_f * def_f) != 0 else 1.0
-    skillmod = (dmg_f * opp_def_f) / denom
-
-    damage_percent_increase = (skillmod - 1.0) * 100.0
-
-    # For damage taken, model enemy outgoing reduction from OppDamageDown as reciprocal of opp_dmg_f
-    # (so higher OppDamageDown reduces enemy damage).
-    enemy_reduction_factor = 1.0 / opp_dmg_f if opp_dmg_f != 0 else 1.0
-    final_damage_taken_multiplier = (1.0 / def_f) * enemy_reduction_factor
-    damage_taken_percent_change = (final_damage_taken_multiplier -
-                                   1.0) * 100.0  # negative = less damage taken
-
-    return {
-        "SkillMod": skillmod,
-        "Damage%Increase": damage_percent_increase,
-        "FinalDamageTakenMultiplier": final_damage_taken_multiplier,
-        "DamageTaken%Change": damage_taken_percent_change,
-        "components": groups
-    }
+    return calculate_skillmod(hero_counts)["components"]
 
 
 # ---------------------------
@@ -164,12 +130,7 @@ def parse_pairs_input(args_dict):
     for raw_name, cnt in args_dict.items():
         if not raw_name:
             continue
-        # match case-insensitive
-        matched = None
-        for h in HERO_DATA:
-            if h.lower() == raw_name.lower():
-                matched = h
-                break
+        matched = normalize_hero_name(raw_name, HERO_NAME_INDEX)
         if not matched:
             raise KeyError(raw_name)
         if cnt is None or cnt <= 0:
@@ -178,44 +139,17 @@ def parse_pairs_input(args_dict):
     return normalized
 
 
+def describe_parse_error(e):
+    """User-facing text for a TeamParseError, with a caret under the problem."""
+    return f"Parse error: {e}\n```\n{e.pointer()}\n```"
+
+
 def parse_compact_string(s: str):
     """
-    Accept "Chenko:4,Amane:2" or "Chenko 4 Amane 2" style, returns normalized dict.
+    Accept "Chenko:4,Amane:2", "Chenko 4 Amane 2" or "Chenko×4" style, returns normalized dict.
+    Raises TeamParseError (a ValueError) or UnknownHeroError (a KeyError).
     """
-    if not s:
-        return {}
-    parts = []
-    if "," in s:
-        raw_items = [p.strip() for p in s.split(",") if p.strip()]
-        for it in raw_items:
-            parts.append(it)
-    else:
-        parts = s.split()
-
-    hero_counts = {}
-    for it in parts:
-        if ":" in it:
-            name, cnt = it.split(":", 1)
-            name = name.strip()
-            cnt = int(cnt.strip())
-        else:
-            # fallback: if single token like "Chenko4" or "Chenko 4"
-            # not robust — user should use "Name:count" or pairs
-            # try to split letters vs digits
-            # but for clarity, raise if format unknown
-            raise ValueError(
-                "Use format: Chenko:4,Amane:2 or pairs. Example: Chenko 4 Amane 2"
-            )
-        # normalize
-        matched = None
-        for h in HERO_DATA:
-            if h.lower() == name.lower():
-                matched = h
-                break
-        if not matched:
-            raise KeyError(name)
-        hero_counts[matched] = hero_counts.get(matched, 0) + cnt
-    return hero_counts
+    return parse_team(s, HERO_NAME_INDEX)
 
 def adapt_skillmod_for_embed(res):
     # convert flat (cat, op) -> value dict into nested {cat: {op: val}}
@@ -241,38 +175,9 @@ def adapt_skillmod_for_embed(res):
 # ---------------------------
 
 
-RECOMMEND_CACHE_FILE = "recommend_cache.json"
-
-def load_recommend_cache():
-    """Load cached global best formations."""
-    if not os.path.exists(RECOMMEND_CACHE_FILE):
-        return {}
-    with open(RECOMMEND_CACHE_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-
-def save_recommend_cache(data):
-    """Save cached results."""
-    with open(RECOMMEND_CACHE_FILE, "w") as f:
-        json.dump(data, f)
-
-
 def parse_roster_string(roster_str):
-    """Parse 'Chenko:3,Amane:2' into dict."""
-    heroes = {}
-    parts = roster_str.split(",")
-    for p in parts:
-        if not p.strip():
-            continue
-        try:
-            name, count = p.split(":")
-            heroes[name.strip()] = int(count.strip())
-        except ValueError:
-            raise ValueError(f"Invalid format near '{p}'")
-    return heroes
+    """Parse 'Chenko:3,Amane:2' (any team format) into a normalized dict."""
+    return parse_team(roster_str, HERO_NAME_INDEX)
 
 
 def generate_combinations(roster_counts, max_size=4):
@@ -293,34 +198,280 @@ def generate_combinations(roster_counts, max_size=4):
     return combos
 
 
-def get_best_formations(roster_counts=None):
-    """Compute best 2 formations for attack and garrison."""
-    all_heroes = roster_counts or {name: 4 for name in HERO_DATA.keys()}
-
-    combos = generate_combinations(all_heroes, max_size=4)
+# Ranked results are kept per roster so /recommend can page through ranks
+# 1..N without recomputing. Each entry holds the scored formations once plus
+# two compact sorted index arrays (attack / garrison) pointing into them.
+RANKED_INDEX_TTL = timedelta(days=1)
+RANKED_INDEX_MAX_ENTRIES = 64
+FORMATION_SLOTS = 4
+MAX_FORMATION_SLOTS = 8
+# Rosters with more formations than this keep only the top SEARCH_TOP_K per
+# objective (see search_ranked_formations) instead of a full index.
+FULL_INDEX_MAX_FORMATIONS = 100_000
+# Past this even the top-K search is too slow to run per request; only the
+# best formation per objective is kept (see optimized_ranked_formations).
+SEARCH_MAX_FORMATIONS = 2_000_000
+
+_ranked_index = OrderedDict()  # roster key -> RankedFormations
+_ranked_index_lock = threading.Lock()
+
+
+class RankedFormations:
+    """Scored formations for one roster, sorted once per objective."""
+
+    def __init__(self, results, built_at, order=None):
+        # results: list of (hero_pairs, skillmod, damage_pct, taken_pct)
+        # order: precomputed rankings (e.g. from a top-K search); sorted here if omitted
+        self.results = results
+        self.built_at = built_at
+        if order is None:
+            positions = range(len(results))
+            # Attack ranking → highest damage%, Garrison ranking → lowest damage taken%
+            order = {
+                "attack": array("I", sorted(positions, key=lambda i: -results[i][2])),
+                "garrison": array("I", sorted(positions, key=lambda i: results[i][3])),
+            }
+        self.order = order
+
+    def __len__(self):
+        return len(self.order["attack"])
+
+    def expired(self, now):
+        return now - self.built_at >= RANKED_INDEX_TTL
+
+    def page(self, objective, start, count):
+        """Return formations ranked start..start+count-1 (0-based) for objective."""
+        sets = []
+        for i in self.order[objective][start:start + count]:
+            pairs, sm, dmg, taken = self.results[i]
+            sets.append({
+                "heroes": dict(pairs),
+                "skillmod": sm,
+                "damage_pct": dmg,
+                "taken_pct": taken,
+            })
+        return sets
+
+
+def build_ranked_formations(roster_counts, max_size=FORMATION_SLOTS):
+    """Score every formation of the roster and build the sorted index."""
+    combos = generate_combinations(roster_counts, max_size=max_size)
     results = []
 
-    for combo in combos:
-        hero_counts = {h: combo.count(h) for h in set(combo)}
+    for combo in sorted(combos):
+        hero_counts = {h: combo.count(h) for h in sorted(set(combo))}
         res = calculate_skillmod(hero_counts)
-        results.append({
-            "heroes": hero_counts,
-            "skillmod": res["SkillMod"],
-            "damage_pct": res["Damage%Increase"],
-            "taken_pct": res["DamageTaken%Change"],
-        })
+        results.append((
+            tuple(hero_counts.items()),
+            res["SkillMod"],
+            res["Damage%Increase"],
+            res["DamageTaken%Change"],
+        ))
+
+    return RankedFormations(results, datetime.now(timezone.utc))
+
+
+def _ranked_index_key(roster_counts, max_size):
+    all_heroes = ({name: max_size for name in HERO_DATA.keys()} if roster_counts is None
+                  else roster_counts)
+    return all_heroes, (tuple(sorted(all_heroes.items())), max_size)
+
+
+def cached_ranked_formations(roster_counts=None, max_size=FORMATION_SLOTS):
+    """The ranked index for a roster if it is cached and fresh, else None (never builds)."""
+    if roster_counts is None and formation_table and max_size <= formation_table.slots:
+        return formation_table.ranked(max_size)
+    _, key = _ranked_index_key(roster_counts, max_size)
+    with _ranked_index_lock:
+        ranked = _ranked_index.get(key)
+        if ranked is not None and not ranked.expired(datetime.now(timezone.utc)):
+            _ranked_index.move_to_end(key)
+            return ranked
+    return None
+
+
+def get_ranked_formations(roster_counts=None, max_size=FORMATION_SLOTS):
+    """Return the cached ranked index for a roster, rebuilding it when stale."""
+    if roster_counts is None and formation_table and max_size <= formation_table.slots:
+        return formation_table.ranked(max_size)
+    ranked = cached_ranked_formations(roster_counts, max_size)
+    if ranked is not None:
+        return ranked
+    all_heroes, key = _ranked_index_key(roster_counts, max_size)
+
+    # Built outside the lock (can take a while); handlers call this from worker threads.
+    limits = [min(c, max_size) for c in all_heroes.values()]
+    n = count_formations(limits, max_size)
+    if n <= FULL_INDEX_MAX_FORMATIONS:
+        ranked = build_ranked_formations(all_heroes, max_size=max_size)
+    elif n <= SEARCH_MAX_FORMATIONS:
+        ranked = search_ranked_formations(all_heroes, max_size=max_size)
+    else:
+        ranked = optimized_ranked_formations(all_heroes, max_size=max_size)
+    with _ranked_index_lock:
+        _ranked_index[key] = ranked
+        _ranked_index.move_to_end(key)
+        while len(_ranked_index) > RANKED_INDEX_MAX_ENTRIES:
+            _ranked_index.popitem(last=False)
+    return ranked
+
+
+# ---------------------------
+# Partitioned top-K search (large rosters / more slots)
+# ---------------------------
+# Splits the multiset space by (first hero used, its count): partition (i, c)
+# holds every formation whose lowest-index hero is i with count c. The
+# partitions are disjoint and cover everything, so each can be searched
+# independently (in its own process) keeping a local top-K, and the global
+# top-K is the best K of the union. Scores are accumulated incrementally in
+# log space in the same hero order everywhere, so a partition's numbers are
+# bit-identical to a single sequential pass and ties break the same way
+# (larger count vector wins).
+
+PARALLEL_SEARCH_THRESHOLD = 200_000  # formations; below this a pool is not worth it
+SEARCH_TOP_K = 50
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0")) or os.cpu_count() or 1
+
+_search_pool = None
+
+
+def _search_rows(hero_names, hero_table):
+    """Per hero: [(op_slot, pct, skillmod_sign, taken_sign)] with ops renumbered densely."""
+    ops = {}
+    rows = []
+    for h in hero_names:
+        row = []
+        for (cat, op, pct) in hero_table[h]:
+            slot = ops.setdefault((cat, op), len(ops))
+            row.append((slot, pct, SKILLMOD_SIGN.get(cat, 0.0), TAKEN_SIGN.get(cat, 0.0)))
+        rows.append(row)
+    return rows, len(ops)
+
+
+def count_formations(limits, size):
+    """Number of multisets of exactly `size` heroes within per-hero limits."""
+    ways = [1] + [0] * size
+    for limit in limits:
+        new = [0] * (size + 1)
+        for total in range(size + 1):
+            if ways[total]:
+                for c in range(min(limit, size - total) + 1):
+                    new[total + c] += ways[total]
+        ways = new
+    return ways[size]
+
+
+def _search_partition(task):
+    """
+    Worker: best-K attack and garrison formations in one (first_hero, count)
+    partition. Returns two lists of (score, counts) with higher = better.
+    """
+    rows, n_ops, limits, size, k, first, first_count = task
+    n = len(rows)
+    capacity = [0] * (n + 1)  # capacity[h] = max heroes available from h onwards
+    for h in range(n - 1, -1, -1):
+        capacity[h] = capacity[h + 1] + limits[h]
+
+    sums = [0.0] * n_ops
+    counts = [0] * n
+    attack, garrison = [], []
+
+    def add(h, c, sm, tk):
+        for slot, pct, sm_sign, tk_sign in rows[h]:
+            s = sums[slot]
+            delta = log1p(s + c * pct) - log1p(s)
+            sums[slot] = s + c * pct
+            sm += sm_sign * delta
+            tk += tk_sign * delta
+        counts[h] = c
+        return sm, tk
+
+    def offer(heap, score):
+        if len(heap) < k:
+            heapq.heappush(heap, (score, tuple(counts)))
+        elif score >= heap[0][0]:
+            heapq.heappushpop(heap, (score, tuple(counts)))
+
+    def dfs(h, left, sm, tk):
+        if left == 0:
+            offer(attack, sm)      # maximize log SkillMod
+            offer(garrison, -tk)   # minimize log damage taken
+            return
+        if h == n or capacity[h] < left:
+            return
+        saved = list(sums)
+        for c in range(min(limits[h], left), 0, -1):
+            sm2, tk2 = add(h, c, sm, tk)
+            dfs(h + 1, left - c, sm2, tk2)
+            sums[:] = saved  # restore exactly rather than subtract back
+            counts[h] = 0
+        dfs(h + 1, left, sm, tk)
+
+    sm, tk = add(first, first_count, 0.0, 0.0)
+    dfs(first + 1, size - first_count, sm, tk)
+    return attack, garrison
+
+
+def _get_search_pool():
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS)
+    return _search_pool
+
+
+def search_top_formations(roster_counts, max_size=FORMATION_SLOTS, k=SEARCH_TOP_K,
+                          workers=1, hero_table=None):
+    """
+    Exact best-k attack and garrison formations for a roster.
+    workers=1 runs the partitions in this process; workers>1 spreads them over
+    a process pool. Both return identical lists of (score, counts) plus the
+    hero order the count vectors refer to.
+    """
+    hero_table = hero_table or HERO_DATA
+    names = sorted(roster_counts, key=lambda h: h.lower())
+    limits = [min(roster_counts[h], max_size) for h in names]
+    rows, n_ops = _search_rows(names, hero_table)
+    tasks = [(rows, n_ops, limits, max_size, k, i, c)
+             for i in range(len(names))
+             for c in range(min(limits[i], max_size), 0, -1)
+             if c + sum(limits[i + 1:]) >= max_size]
+
+    if workers > 1:
+        pool = (_get_search_pool() if workers == SEARCH_WORKERS
+                else ProcessPoolExecutor(max_workers=workers))
+        try:
+            partials = list(pool.map(_search_partition, tasks, chunksize=1))
+        finally:
+            if pool is not _search_pool:
+                pool.shutdown()
+    else:
+        partials = [_search_partition(t) for t in tasks]
 
-    # Attack ranking → highest damage%
-    best_attack = sorted(results, key=lambda x: x["damage_pct"], reverse=True)[:2]
-    # Garrison ranking → lowest damage taken%
-    best_garrison = sorted(results, key=lambda x: x["taken_pct"])[:2]
+    attack = heapq.nlargest(k, (e for a, _ in partials for e in a))
+    garrison = heapq.nlargest(k, (e for _, g in partials for e in g))
+    return names, attack, garrison
 
-    return best_attack, best_garrison
+
+def search_ranked_formations(roster_counts, max_size=FORMATION_SLOTS, k=SEARCH_TOP_K):
+    """Top-k of a large roster as a RankedFormations (parallel when worth it)."""
+    limits = [min(c, max_size) for c in roster_counts.values()]
+    workers = SEARCH_WORKERS if count_formations(limits, max_size) >= PARALLEL_SEARCH_THRESHOLD else 1
+    names, attack, garrison = search_top_formations(roster_counts, max_size, k, workers)
+
+    results = []
+    for _, counts in attack + garrison:
+        hero_counts = {h: c for h, c in zip(names, counts) if c}
+        res = calculate_skillmod(hero_counts)
+        results.append((tuple(hero_counts.items()), res["SkillMod"],
+                        res["Damage%Increase"], res["DamageTaken%Change"]))
+    order = {"attack": array("I", range(len(attack))),
+             "garrison": array("I", range(len(attack), len(results)))}
+    return RankedFormations(results, datetime.now(timezone.utc), order=order)
 
 
-def format_formations(sets):
+def format_formations(sets, start=1):
     lines = []
-    for i, s in enumerate(sets, 1):
+    for i, s in enumerate(sets, start):
         heroes = ", ".join(f"{h}×{c}" for h, c in s["heroes"].items())
         dmg = s["damage_pct"]
         taken = s["taken_pct"]
@@ -331,11 +482,954 @@ def format_formations(sets):
     return "\n\n".join(lines) if lines else "No valid formations found."
 
 
+# ---------------------------
+# Vectorized scoring (numpy)
+# ---------------------------
+# The same math as compute_factors_from_hero_counts, laid out as arrays so many
+# teams / hero tables can be scored in one pass. Each column is one
+# (category, effect_op); a category factor is the product of (1 + op_sum) over
+# its ops, so in log space SkillMod and damage taken are signed sums of
+# log1p(op_sum).
+
+OP_KEYS = SKILLMOD_KERNEL.op_keys  # only ops some hero provides
+OP_INDEX = {key: j for j, key in enumerate(OP_KEYS)}
+
+# log(output) = sum over ops of weight[category] * log1p(op_sum), from the formula:
+# SkillMod = (DamageUp * OppDefenseDown) / (OppDamageDown * DefenseUp)
+SKILLMOD_SIGN = SKILLMOD_KERNEL.log_weights("SkillMod")
+# Damage taken multiplier = 1 / (DefenseUp * OppDamageDown)
+TAKEN_SIGN = SKILLMOD_KERNEL.log_weights("DamageTaken")
+
+OP_SKILLMOD_SIGN = np.array([SKILLMOD_SIGN.get(cat, 0.0) for cat, _ in OP_KEYS])
+OP_TAKEN_SIGN = np.array([TAKEN_SIGN.get(cat, 0.0) for cat, _ in OP_KEYS])
+
+# One row per hero effect, in HERO_DATA order.
+EFFECT_KEYS = [(hero, cat, op) for hero, effects in HERO_DATA.items()
+               for (cat, op, _) in effects]
+EFFECT_VALUES = np.array([pct for effects in HERO_DATA.values()
+                          for (_, _, pct) in effects])
+EFFECT_OP_MATRIX = np.zeros((len(EFFECT_KEYS), len(OP_KEYS)))
+for k, (_, cat, op) in enumerate(EFFECT_KEYS):
+    EFFECT_OP_MATRIX[k, OP_INDEX[(cat, op)]] = 1.0
+
+
+def score_op_sums(op_sums):
+    """
+    op_sums: array (..., len(OP_KEYS)) of per-op decimal sums.
+    Returns (skillmod, damage_taken_multiplier) arrays of shape (...).
+    """
+    logs = np.log1p(op_sums)
+    return np.exp(logs @ OP_SKILLMOD_SIGN), np.exp(logs @ OP_TAKEN_SIGN)
+
+
+def team_effect_counts(teams):
+    """Count matrix (teams, effects): how many copies of each effect's hero a team has."""
+    counts = np.zeros((len(teams), len(EFFECT_KEYS)))
+    for t, hero_counts in enumerate(teams):
+        for k, (hero, _, _) in enumerate(EFFECT_KEYS):
+            counts[t, k] = hero_counts.get(hero, 0)
+    return counts
+
+
+# ---------------------------
+# Greedy optimizer (product-of-ops structure)
+# ---------------------------
+# In log space an objective is a weighted sum over ops of log1p(op_sum). If
+# every hero touches at most one op that matters for the objective, each op
+# is an independent concave "bucket": filling it with its largest pcts first,
+# the k-th unit adds log1p(S_k + p_k) - log1p(S_k), which only shrinks as k
+# grows (for any starting S_0 >= 0). Maximizing a sum of concave buckets under
+# a slot budget is solved exactly by repeatedly taking the largest marginal
+# gain; heroes touching no relevant op are zero-gain fillers.
+#
+# Heroes hitting two relevant ops (Saul for garrison, Hilde for attack) break
+# separability, so their counts are enumerated and the greedy runs on the
+# rest with their sums as the starting point. If a slot could only be filled
+# by a unit that hurts the objective (losses are not concave), or the
+# enumeration gets large, the exact search is used instead.
+
+OBJECTIVE_WEIGHTS = {
+    "attack": SKILLMOD_SIGN,                                   # maximize log SkillMod
+    "garrison": {cat: -w for cat, w in TAKEN_SIGN.items()},   # minimize log damage taken
+}
+GREEDY_MAX_ENUMERATION = 512
+
+
+def _relevant_effects(hero, weights):
+    return [(cat, op, pct) for (cat, op, pct) in HERO_DATA[hero] if weights.get(cat, 0.0)]
+
+
+def greedy_formation(roster_counts, objective="attack", max_size=FORMATION_SLOTS,
+                     base=None):
+    """
+    Fill max_size slots from single-relevant-effect heroes by largest marginal
+    log-gain, starting from per-op sums `base`. Returns {hero: count}, or None
+    when a harmful unit would be needed (greedy not provably optimal there).
+    The roster must hold at least max_size heroes.
+    """
+    weights = OBJECTIVE_WEIGHTS[objective]
+    base = base or {}
+    buckets = {}   # (cat, op) -> [weight, op_sum, [(pct, hero), ...] best first]
+    fillers = []   # zero-gain units
+    for hero, limit in roster_counts.items():
+        relevant = _relevant_effects(hero, weights)
+        if not relevant:
+            fillers.extend([hero] * min(limit, max_size))
+            continue
+        cat, op, pct = relevant[0]
+        bucket = buckets.setdefault((cat, op), [weights[cat], base.get((cat, op), 0.0), []])
+        bucket[2].extend([(pct, hero)] * min(limit, max_size))
+    for bucket in buckets.values():
+        bucket[2].sort(key=lambda u: (-u[0], u[1]))
+
+    picks = {}
+    for _ in range(max_size):
+        best_gain, best_key = 0.0, None
+        for key, (w, s, units) in buckets.items():
+            if units and w > 0:
+                gain = w * (log1p(s + units[0][0]) - log1p(s))
+                if gain > best_gain:
+                    best_gain, best_key = gain, key
+        if best_key is not None:
+            bucket = buckets[best_key]
+            pct, hero = bucket[2].pop(0)
+            bucket[1] += pct
+        elif fillers:
+            hero = fillers.pop()
+        else:
+            return None  # only harmful units left: not covered by the greedy argument
+        picks[hero] = picks.get(hero, 0) + 1
+    return picks
+
+
+def _count_mixes(limits, max_total):
+    """Every count vector within `limits` whose total is at most max_total."""
+    if not limits:
+        yield ()
+        return
+    for c in range(min(limits[0], max_total) + 1):
+        for rest in _count_mixes(limits[1:], max_total - c):
+            yield (c,) + rest
+
+
+def _objective_value(hero_counts, objective):
+    res = calculate_skillmod(hero_counts)
+    return res["Damage%Increase"] if objective == "attack" else -res["DamageTaken%Change"]
+
+
+def optimize_formation(roster_counts, objective="attack", max_size=FORMATION_SLOTS):
+    """
+    Optimal formation for one objective in roughly O(slots × heroes): greedy
+    over single-effect heroes for each count mix of the multi-effect ones,
+    exact search when that is not provably optimal. Returns
+    (formation dict or None if the roster is too small, method).
+    """
+    weights = OBJECTIVE_WEIGHTS[objective]
+    roster_counts = {h: c for h, c in roster_counts.items() if c > 0}
+    multi = [h for h in roster_counts if len(_relevant_effects(h, weights)) > 1]
+    single = {h: c for h, c in roster_counts.items() if h not in multi}
+    single_units = sum(min(c, max_size) for c in single.values())
+
+    limits = [min(roster_counts[h], max_size) for h in multi]
+    n_mixes = sum(count_formations(limits, total) for total in range(max_size + 1))
+    picks, method = None, "greedy"
+    if n_mixes <= GREEDY_MAX_ENUMERATION:
+        best_value = None
+        for mix in _count_mixes(limits, max_size):
+            fixed = {h: c for h, c in zip(multi, mix) if c}
+            left = max_size - sum(mix)
+            if left < 0 or left > single_units:
+                continue
+            base = defaultdict(float)
+            for hero, count in fixed.items():
+                for (cat, op, pct) in HERO_DATA[hero]:
+                    base[(cat, op)] += pct * count
+            rest = greedy_formation(single, objective, left, base)
+            if rest is None:
+                picks, method = None, "exact"
+                break
+            team = {**fixed, **rest}
+            value = _objective_value(team, objective)
+            if best_value is None or value > best_value + 1e-12:
+                picks, best_value = team, value
+    else:
+        method = "exact"
+
+    if method == "exact":
+        names, attack, garrison = search_top_formations(roster_counts, max_size, k=1)
+        best = attack if objective == "attack" else garrison
+        picks = {h: c for h, c in zip(names, best[0][1]) if c} if best else None
+
+    if not picks:
+        return None, method
+    res = calculate_skillmod(picks)
+    return {
+        "heroes": picks,
+        "skillmod": res["SkillMod"],
+        "damage_pct": res["Damage%Increase"],
+        "taken_pct": res["DamageTaken%Change"],
+    }, method
+
+
+def optimized_ranked_formations(roster_counts, max_size=FORMATION_SLOTS):
+    """Rank 1 per objective from optimize_formation, as a RankedFormations."""
+    results, order = [], {}
+    for objective in ("attack", "garrison"):
+        best, _ = optimize_formation(roster_counts, objective, max_size)
+        order[objective] = array("I")
+        if best is not None:
+            order[objective].append(len(results))
+            results.append((tuple(sorted(best["heroes"].items())), best["skillmod"],
+                            best["damage_pct"], best["taken_pct"]))
+    return RankedFormations(results, datetime.now(timezone.utc), order=order)
+
+
+# ---------------------------
+# Count sweeps / hero-count grids
+# ---------------------------
+
+SWEEP_MAX_AXES = 3
+SWEEP_DISPLAY_MAX = 13  # cells per axis shown in Discord
+SWEEP_INLINE_CELLS = 4096  # bigger grids go through heavy-job admission
+SWEEP_MAX_COUNT = 64  # highest hero count on an axis
+SWEEP_MAX_CELLS = 1_000_000
+
+_AXIS_RE = re.compile(r"^\s*([A-Za-z]+)\s*[:=×x]\s*(\d+)\s*(?:(?:\.\.|-)\s*(\d+))?\s*$")
+
+# Per-hero op rows: HERO_OP_MATRIX[h] is the per-op sum added by one copy of hero h.
+HERO_KEYS = list(HERO_DATA.keys())
+HERO_INDEX = {h: i for i, h in enumerate(HERO_KEYS)}
+HERO_OP_MATRIX = np.zeros((len(HERO_KEYS), len(OP_KEYS)))
+for _h, _effects in HERO_DATA.items():
+    for (_cat, _op, _pct) in _effects:
+        HERO_OP_MATRIX[HERO_INDEX[_h], OP_INDEX[(_cat, _op)]] += _pct
+
+
+def hero_counts_to_op_sums(hero_counts):
+    """Per-op sum vector for a team, same values as compute_factors_from_hero_counts' per_op."""
+    vec = np.zeros(len(OP_KEYS))
+    for hero, count in hero_counts.items():
+        if hero not in HERO_INDEX:
+            raise KeyError(hero)
+        vec += count * HERO_OP_MATRIX[HERO_INDEX[hero]]
+    return vec
+
+
+def sweep_grid(axes, base_counts=None):
+    """
+    axes: list of (hero, counts) e.g. [("Chenko", range(0, 7)), ("Amane", range(0, 5))].
+    base_counts: fixed heroes added to every cell.
+    Returns (skillmod, damage_taken_multiplier, total_heroes) arrays shaped
+    (len(counts_1), len(counts_2), ...), all cells evaluated in one broadcast.
+    """
+    op_sums = hero_counts_to_op_sums(base_counts or {})
+    totals = np.array(sum((base_counts or {}).values()))
+    ndim = len(axes)
+    for d, (hero, counts) in enumerate(axes):
+        shape = [1] * ndim
+        shape[d] = -1
+        c = np.asarray(counts, dtype=float).reshape(shape)
+        op_sums = op_sums + c[..., None] * HERO_OP_MATRIX[HERO_INDEX[hero]]
+        totals = totals + c
+    skillmod, taken = score_op_sums(op_sums)
+    return skillmod, taken, np.broadcast_to(totals, skillmod.shape)
+
+
+def parse_sweep_axes(spec: str):
+    """Parse "Chenko:1..6, Amane:0..4" into [(hero, range), ...]."""
+    axes = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        m = _AXIS_RE.match(item)
+        if not m:
+            raise ValueError(f"Invalid sweep axis near '{item.strip()}'. Use Hero:1..6")
+        name, lo, hi = m.group(1), int(m.group(2)), int(m.group(3) or m.group(2))
+        if max(lo, hi) > SWEEP_MAX_COUNT:
+            raise ValueError(f"Counts go up to {SWEEP_MAX_COUNT} per hero (got '{item.strip()}')")
+        matched = normalize_hero_name(name, HERO_NAME_INDEX)
+        if not matched:
+            raise KeyError(name)
+        if any(h == matched for h, _ in axes):
+            raise ValueError(f"{matched} is listed twice")
+        axes.append((matched, range(min(lo, hi), max(lo, hi) + 1)))
+    if not axes or len(axes) > SWEEP_MAX_AXES:
+        raise ValueError(f"Give 1 to {SWEEP_MAX_AXES} heroes to sweep, e.g. Chenko:1..6")
+    cells = prod(len(counts) for _, counts in axes)
+    if cells > SWEEP_MAX_CELLS:
+        raise ValueError(f"That grid has {cells:,} cells; the limit is {SWEEP_MAX_CELLS:,}")
+    return axes
+
+
+def best_sweep_cell(skillmod, taken, totals, objective="attack", total=None):
+    """Index of the best cell (optionally only cells with exactly `total` heroes)."""
+    score = skillmod if objective == "attack" else -taken
+    if total is not None:
+        score = np.where(totals == total, score, -np.inf)
+        if not np.isfinite(score).any():
+            return None
+    return np.unravel_index(np.argmax(score), score.shape)
+
+
+def _display_window(n, center):
+    """Start of the SWEEP_DISPLAY_MAX-wide window over n cells that contains `center`."""
+    if n <= SWEEP_DISPLAY_MAX or center is None:
+        return 0
+    return max(0, min(center - SWEEP_DISPLAY_MAX // 2, n - SWEEP_DISPLAY_MAX))
+
+
+def _window_note(hero, counts, start):
+    shown = counts[start:start + SWEEP_DISPLAY_MAX]
+    if len(shown) == len(counts):
+        return ""
+    return f"{hero}: showing {shown.start}..{shown.stop - 1} of {counts.start}..{counts.stop - 1}\n"
+
+
+def format_sweep(axes, skillmod, taken, totals, best, objective="attack", total=None):
+    """
+    Render a 1-D table or a 2-D matrix (3-D: the slice holding the best cell).
+    Axes longer than SWEEP_DISPLAY_MAX show the window around the best cell.
+    """
+    def cell(idx):
+        if total is not None and totals[idx] != total:
+            return "·"
+        if objective == "attack":
+            return f"{skillmod[idx]:.3f}"
+        return f"{(taken[idx] - 1) * 100:+.1f}%"
+
+    if len(axes) == 1:
+        hero, counts = axes[0]
+        start = _display_window(len(counts), best[0] if best is not None else None)
+        rows = [f"{'':2}{hero:>8}  SkillMod   Damage    Taken"]
+        for i, c in enumerate(counts[start:start + SWEEP_DISPLAY_MAX], start):
+            mark = "▶ " if best is not None and best[0] == i else "  "
+            if total is not None and totals[i] != total:
+                rows.append(f"{mark}{c:>8}  {'·':>8}")
+                continue
+            rows.append(
+                f"{mark}{c:>8}  {skillmod[i]:>7.3f}×  {(skillmod[i] - 1) * 100:+6.1f}%  {(taken[i] - 1) * 100:+6.1f}%")
+        return _window_note(hero, counts, start) + "```\n" + "\n".join(rows) + "\n```"
+
+    note = ""
+    if len(axes) == 3:
+        k = best[2] if best is not None else 0
+        note = f"{axes[2][0]} × {axes[2][1][k]} (slice containing the best cell)\n"
+        skillmod, taken, totals = skillmod[..., k], taken[..., k], totals[..., k]
+        best = best[:2] if best is not None else None
+
+    (row_hero, row_counts), (col_hero, col_counts) = axes[0], axes[1]
+    row_start = _display_window(len(row_counts), best[0] if best is not None else None)
+    col_start = _display_window(len(col_counts), best[1] if best is not None else None)
+    note += _window_note(row_hero, row_counts, row_start) + _window_note(col_hero, col_counts, col_start)
+    row_counts = row_counts[row_start:row_start + SWEEP_DISPLAY_MAX]
+    col_counts = col_counts[col_start:col_start + SWEEP_DISPLAY_MAX]
+    width = 7 if objective == "attack" else 8
+    header = f"{row_hero[:6] + '↓ ' + col_hero[:6] + '→':>16}" + "".join(
+        f"{c:>{width + 2}}" for c in col_counts)
+    rows = [header]
+    for i, r in enumerate(row_counts, row_start):
+        line = f"{r:>16}"
+        for j in range(col_start, col_start + len(col_counts)):
+            text = cell((i, j))
+            if best is not None and (i, j) == tuple(best):
+                text = f"[{text}]"
+            line += f"{text:>{width + 2}}"
+        rows.append(line)
+    return note + "```\n" + "\n".join(rows) + "\n```"
+
+
+# ---------------------------
+# Sensitivity analysis (Monte Carlo)
+# ---------------------------
+
+SENSITIVITY_SAMPLES = 5000
+SENSITIVITY_MAX_SAMPLES = 20000
+SENSITIVITY_MAX_TEAMS = 10
+
+_RANGE_RE = re.compile(
+    r"^\s*([A-Za-z]+)\s*(?:@\s*(\d+))?\s*=\s*([0-9]*\.?[0-9]+)\s*(\.\.|~|±)\s*([0-9]*\.?[0-9]+)\s*$")
+
+
+def parse_sensitivity_ranges(spec: str):
+    """
+    Parse "Amane=0.20..0.30, Saul@113=0.15~0.02" into {effect_index: (kind, a, b)}.
+    `lo..hi` samples uniformly, `mean~sd` (or `mean±sd`) samples a normal.
+    Heroes with several effects need the effect_op after `@`.
+    """
+    ranges = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        m = _RANGE_RE.match(item)
+        if not m:
+            raise ValueError(
+                f"Invalid range near '{item.strip()}'. Use Hero=0.20..0.30 or Hero=0.25~0.02")
+        name, op, a, sep, b = m.groups()
+        matched = normalize_hero_name(name, HERO_NAME_INDEX)
+        if not matched:
+            raise KeyError(name)
+        idx = [k for k, (hero, _, eff_op) in enumerate(EFFECT_KEYS)
+               if hero == matched and (op is None or eff_op == int(op))]
+        if not idx:
+            raise ValueError(f"{matched} has no effect_op {op}")
+        if len(idx) > 1:
+            ops = "/".join(str(EFFECT_KEYS[k][2]) for k in idx)
+            raise ValueError(f"{matched} has several effects (op {ops}); use {matched}@<op>=...")
+        a, b = float(a), float(b)
+        if sep == "..":
+            ranges[idx[0]] = ("uniform", min(a, b), max(a, b))
+        else:
+            ranges[idx[0]] = ("normal", a, b)
+    return ranges
+
+
+def sample_hero_tables(ranges, samples, rng):
+    """Return an (samples, effects) array of effect values; unlisted effects stay fixed."""
+    table = np.tile(EFFECT_VALUES, (samples, 1))
+    for k, (kind, a, b) in ranges.items():
+        if kind == "uniform":
+            table[:, k] = rng.uniform(a, b, samples)
+        else:
+            table[:, k] = np.clip(rng.normal(a, b, samples), 0.0, None)
+    return table
+
+
+def run_sensitivity(teams, ranges, samples=SENSITIVITY_SAMPLES,
+                    objective="attack", rng=None):
+    """
+    Score every team against `samples` sampled hero tables in one batch.
+    Returns per-team stats sorted by mean score (best first): SkillMod and
+    damage-taken 90% intervals, chance of ranking first, and rank spread.
+    """
+    rng = rng or np.random.default_rng()
+    table = sample_hero_tables(ranges, samples, rng)             # (S, K)
+    counts = team_effect_counts(teams)                           # (T, K)
+    op_sums = (table[:, None, :] * counts[None, :, :]) @ EFFECT_OP_MATRIX  # (S, T, J)
+    skillmod, taken = score_op_sums(op_sums)                     # (S, T)
+
+    # Attack: higher SkillMod is better. Garrison: lower damage taken is better.
+    score = skillmod if objective == "attack" else -taken
+    # Competition ranking (1 = best): equal teams share a rank instead of
+    # being split by sort order.
+    ranks = 1 + (score[:, None, :] > score[:, :, None] + 1e-12).sum(axis=2)
+
+    sm_lo, sm_hi = np.percentile(skillmod, [5, 95], axis=0)
+    tk_lo, tk_hi = np.percentile(taken, [5, 95], axis=0)
+    rank_lo, rank_hi = np.percentile(ranks, [5, 95], axis=0)
+    stats = []
+    for t, hero_counts in enumerate(teams):
+        stats.append({
+            "heroes": hero_counts,
+            "skillmod_mean": float(skillmod[:, t].mean()),
+            "skillmod_ci": (float(sm_lo[t]), float(sm_hi[t])),
+            "taken_pct_ci": ((float(tk_lo[t]) - 1) * 100, (float(tk_hi[t]) - 1) * 100),
+            "taken_pct_mean": (float(taken[:, t].mean()) - 1) * 100,
+            "p_best": float((ranks[:, t] == 1).mean()),
+            "rank_range": (int(rank_lo[t]), int(rank_hi[t])),
+            "rank_median": float(np.median(ranks[:, t])),
+        })
+    key = "skillmod_mean" if objective == "attack" else "taken_pct_mean"
+    stats.sort(key=lambda s: s[key], reverse=(objective == "attack"))
+    return stats
+
+
+def format_sensitivity(stats, objective="attack"):
+    lines = []
+    for i, s in enumerate(stats, 1):
+        heroes = ", ".join(f"{h}×{c}" for h, c in s["heroes"].items())
+        sm_lo, sm_hi = s["skillmod_ci"]
+        tk_lo, tk_hi = s["taken_pct_ci"]
+        r_lo, r_hi = s["rank_range"]
+        rank = f"#{r_lo}" if r_lo == r_hi else f"#{r_lo}–#{r_hi}"
+        if objective == "attack":
+            value = f"SkillMod `{s['skillmod_mean']:.3f}×` (90%: `{sm_lo:.3f}–{sm_hi:.3f}`)"
+        else:
+            value = f"Damage Taken `{s['taken_pct_mean']:+.1f}%` (90%: `{tk_lo:+.1f}%…{tk_hi:+.1f}%`)"
+        lines.append(
+            f"**{i}.** {heroes}\n{value}\n🎯 Ranked #1 in `{s['p_best']*100:.0f}%` of samples · rank {rank}")
+    return "\n\n".join(lines) if lines else "No teams to analyse."
+
+
+# ---------------------------
+# Matchups / counter-picks
+# ---------------------------
+# Both sides of a fight, from per-op sums in log space. What a team does to
+# the other side (its offense) is DamageUp × OppDefenseDown; what protects it
+# (its guard) is DefenseUp × OppDamageDown. So for every pair
+#   damage dealt by A to B = offense(A) / guard(B)
+#   damage taken by A from B = offense(B) / guard(A)
+# and a whole (candidates × enemies) matchup is two outer differences of
+# log vectors. Against an empty enemy these reduce to A's own damage and
+# damage-taken multipliers.
+
+COUNTER_MAX_ENEMIES = 8
+COUNTER_MAX_ENEMY_HEROES = 64  # per enemy team
+COUNTER_TOP = 5
+COUNTER_INLINE_FORMATIONS = 5_000  # more candidates than this go through heavy-job admission
+
+OFFENSE_SIGN = SKILLMOD_KERNEL.log_weights("Offense")
+GUARD_SIGN = SKILLMOD_KERNEL.log_weights("Guard")
+OP_OFFENSE_SIGN = np.array([OFFENSE_SIGN.get(cat, 0.0) for cat, _ in OP_KEYS])
+OP_GUARD_SIGN = np.array([GUARD_SIGN.get(cat, 0.0) for cat, _ in OP_KEYS])
+
+
+def formation_count_matrix(roster_counts, max_size=FORMATION_SLOTS):
+    """Every formation of exactly max_size heroes as rows of hero counts (HERO_KEYS order)."""
+    rows = np.zeros((1, len(HERO_KEYS)), dtype=np.int16)
+    totals = np.zeros(1, dtype=np.int16)
+    for hero, limit in roster_counts.items():
+        h = HERO_INDEX[hero]
+        blocks = []
+        for c in range(min(limit, max_size) + 1):
+            keep = totals + c <= max_size
+            block = rows[keep].copy()
+            block[:, h] = c
+            blocks.append((block, totals[keep] + c))
+        rows = np.concatenate([b for b, _ in blocks])
+        totals = np.concatenate([t for _, t in blocks])
+    return rows[totals == max_size]
+
+
+def hero_count_matrix(teams):
+    """Rows of hero counts (HERO_KEYS order) for a list of {hero: count} dicts."""
+    counts = np.zeros((len(teams), len(HERO_KEYS)), dtype=np.int32)
+    for t, hero_counts in enumerate(teams):
+        for hero, count in hero_counts.items():
+            counts[t, HERO_INDEX[hero]] = count
+    return counts
+
+
+def side_factors(count_matrix):
+    """(offense, guard) log-factor vectors for rows of hero counts."""
+    logs = np.log1p(count_matrix @ HERO_OP_MATRIX)
+    return logs @ OP_OFFENSE_SIGN, logs @ OP_GUARD_SIGN
+
+
+def matchup_matrix(ours, theirs):
+    """
+    ours: (n, heroes) and theirs: (m, heroes) hero-count rows.
+    Returns (dealt, taken), both (n, m) damage multipliers of ours vs theirs.
+    """
+    off_a, guard_a = side_factors(ours)
+    off_b, guard_b = side_factors(theirs)
+    dealt = np.exp(off_a[:, None] - guard_b[None, :])
+    taken = np.exp(off_b[None, :] - guard_a[:, None])
+    return dealt, taken
+
+
+def counter_picks(enemies, roster_counts=None, objective="attack",
+                  max_size=FORMATION_SLOTS, top=COUNTER_TOP):
+    """
+    Best formations from the roster against every enemy formation at once.
+    Candidates are ranked on their worst case over the enemies: attack by
+    damage dealt (ties: less taken), garrison by damage taken (ties: more dealt).
+    The model is separable in log space (dealt = offense(A) - guard(B)), so
+    that order is the same for any enemy; the enemies only set the margins.
+    """
+    roster = ({name: max_size for name in HERO_DATA.keys()} if roster_counts is None
+              else roster_counts)
+    candidates = formation_count_matrix(roster, max_size)
+    dealt, taken = matchup_matrix(candidates, hero_count_matrix(enemies))
+    worst_dealt, worst_taken = dealt.min(axis=1), taken.max(axis=1)
+    if objective == "attack":
+        order = np.lexsort((worst_taken, -worst_dealt))
+    else:
+        order = np.lexsort((-worst_dealt, worst_taken))
+
+    picks = []
+    for i in order[:top]:
+        picks.append({
+            "heroes": {HERO_KEYS[h]: int(c) for h, c in enumerate(candidates[i]) if c},
+            "dealt": dealt[i].tolist(),
+            "taken": taken[i].tolist(),
+            "worst_dealt": float(worst_dealt[i]),
+            "worst_taken": float(worst_taken[i]),
+        })
+    return picks, len(candidates)
+
+
+def format_counter_picks(picks, enemies, objective="attack"):
+    lines = []
+    for i, p in enumerate(picks, 1):
+        heroes = ", ".join(f"{h}×{c}" for h, c in p["heroes"].items())
+        edge = p["worst_dealt"] / p["worst_taken"]
+        line = (f"**{i}.** {heroes}\n"
+                f"💥 Dealt `{(p['worst_dealt'] - 1) * 100:+.1f}%` · "
+                f"🛡️ Taken `{(p['worst_taken'] - 1) * 100:+.1f}%` · edge `{edge:.2f}×`")
+        if len(enemies) > 1:
+            best = max(range(len(enemies)), key=lambda j: p["dealt"][j] / p["taken"][j])
+            worst = min(range(len(enemies)), key=lambda j: p["dealt"][j] / p["taken"][j])
+            line += f"\nBest vs enemy {best + 1}, hardest vs enemy {worst + 1}"
+        lines.append(line)
+    return "\n\n".join(lines) if lines else "No formations to rank."
+
+
+# ---------------------------
+# Guild leaderboard of saved presets
+# ---------------------------
+# Every preset saved inside a guild is scored once and kept in per-guild
+# sorted indexes, so /leaderboard reads top-N and ranks without rescanning
+# presets.json. Scores live in PRESET_INDEX_FILE next to a fingerprint of
+# HERO_DATA; they are recomputed in one batch only when the fingerprint changes.
+
+PRESET_INDEX_FILE = "preset_index.json"
+LEADERBOARD_SIZE = 10
+
+
+def hero_data_fingerprint():
+    return hashlib.sha256(json.dumps(HERO_DATA, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def score_hero_counts_batch(teams):
+    """Score many teams at once -> list of {"skillmod", "damage_pct", "taken_pct"}."""
+    counts = np.zeros((len(teams), len(HERO_KEYS)))
+    for t, hero_counts in enumerate(teams):
+        for hero, count in hero_counts.items():
+            counts[t, HERO_INDEX[hero]] = count
+    skillmod, taken = score_op_sums(counts @ HERO_OP_MATRIX)
+    return [{"skillmod": float(sm), "damage_pct": (float(sm) - 1) * 100,
+             "taken_pct": (float(tk) - 1) * 100}
+            for sm, tk in zip(skillmod, taken)]
+
+
+class GuildLeaderboard:
+    """Sorted indexes of one guild's presets: attack (SkillMod / damage dealt) and garrison (damage taken)."""
+
+    def __init__(self):
+        self.index = {"attack": SortedList(), "garrison": SortedList()}
+
+    @staticmethod
+    def keys(user_id, name, score):
+        # Best first in both: highest SkillMod, lowest damage taken.
+        return {"attack": (-score["skillmod"], user_id, name),
+                "garrison": (score["taken_pct"], user_id, name)}
+
+    def __len__(self):
+        return len(self.index["attack"])
+
+    def add(self, user_id, name, score):
+        for metric, key in self.keys(user_id, name, score).items():
+            self.index[metric].add(key)
+
+    def remove(self, user_id, name, score):
+        for metric, key in self.keys(user_id, name, score).items():
+            self.index[metric].discard(key)
+
+    def top(self, metric, n):
+        """[(user_id, preset_name), ...] for the best n presets."""
+        return [(user_id, name) for _, user_id, name in self.index[metric].islice(0, n)]
+
+    def rank(self, metric, user_id, name, score):
+        """1-based rank of a preset."""
+        return self.index[metric].index(self.keys(user_id, name, score)[metric]) + 1
+
+
+class PresetLeaderboards:
+    """Preset scores per user plus a GuildLeaderboard per guild."""
+
+    def __init__(self, path=PRESET_INDEX_FILE):
+        self.path = path
+        self.entries = {}  # user_id -> {preset_name: {"guild", "skillmod", "damage_pct", "taken_pct"}}
+        self.guilds = defaultdict(GuildLeaderboard)
+
+    def load(self):
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except Exception:
+                data = {}
+        self.entries = data.get("presets", {})
+        if data.get("hero_data") != hero_data_fingerprint():
+            self.rebuild()
+        else:
+            self._build_indexes()
+        return self
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({"hero_data": hero_data_fingerprint(), "presets": self.entries}, f)
+
+    def _build_indexes(self):
+        self.guilds = defaultdict(GuildLeaderboard)
+        per_guild = defaultdict(lambda: {"attack": [], "garrison": []})
+        for user_id, presets in self.entries.items():
+            for name, entry in presets.items():
+                if entry.get("guild"):
+                    for metric, key in GuildLeaderboard.keys(user_id, name, entry).items():
+                        per_guild[entry["guild"]][metric].append(key)
+        for guild_id, keys in per_guild.items():
+            board = self.guilds[guild_id]
+            for metric, items in keys.items():
+                board.index[metric] = SortedList(items)
+
+    def rebuild(self):
+        """Rescore every indexed preset in one batch (after HERO_DATA changes)."""
+        presets = load_all_presets()
+        refs, teams = [], []
+        for user_id, user_entries in self.entries.items():
+            for name, entry in user_entries.items():
+                team_string = presets.get(user_id, {}).get(name)
+                try:
+                    hero_counts = parse_compact_string(team_string)
+                except (KeyError, ValueError, TypeError):
+                    continue
+                refs.append((user_id, name, entry.get("guild")))
+                teams.append(hero_counts)
+        self.entries = {}
+        for (user_id, name, guild_id), score in zip(refs, score_hero_counts_batch(teams)):
+            self.entries.setdefault(user_id, {})[name] = dict(score, guild=guild_id)
+        self._build_indexes()
+        self.save()
+
+    def update(self, user_id, name, hero_counts, guild_id):
+        """Score a saved/overwritten preset and move it in the indexes: O(log n)."""
+        old = self.entries.get(user_id, {}).get(name)
+        if old and old.get("guild"):
+            self.guilds[old["guild"]].remove(user_id, name, old)
+        res = calculate_skillmod(hero_counts)
+        entry = {"guild": guild_id, "skillmod": res["SkillMod"],
+                 "damage_pct": res["Damage%Increase"],
+                 "taken_pct": res["DamageTaken%Change"]}
+        self.entries.setdefault(user_id, {})[name] = entry
+        if guild_id:
+            self.guilds[guild_id].add(user_id, name, entry)
+        self.save()
+
+    def board(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def user_best(self, guild_id, metric, user_id):
+        """(rank, preset_name) of the user's best preset in this guild, or None."""
+        board = self.guilds.get(guild_id)
+        best = None
+        for name, entry in self.entries.get(user_id, {}).items():
+            if board is not None and entry.get("guild") == guild_id:
+                rank = board.rank(metric, user_id, name, entry)
+                if best is None or rank < best[0]:
+                    best = (rank, name)
+        return best
+
+
+_preset_leaderboards = None
+
+
+def get_preset_leaderboards():
+    global _preset_leaderboards
+    if _preset_leaderboards is None:
+        _preset_leaderboards = PresetLeaderboards().load()
+    return _preset_leaderboards
+
+
+# ---------------------------
+# Precomputed formation table (memory-mapped)
+# ---------------------------
+# For the standard roster (every hero, any count) every formation of up to
+# FORMATION_TABLE_SLOTS heroes is scored once offline by
+# tools/build_formation_table.py and written as one .npy file per column.
+# Row r holds the formation whose combinatorial rank is r, so a lookup is a
+# rank computation plus one read. The order_* columns are row numbers sorted
+# by (size, objective), so top-K for a size is a slice. Columns are opened
+# with mmap_mode="r": the pages live in the OS page cache and are shared by
+# every process that maps the same files. get_ranked_formations serves the
+# default roster from it; single teams still go through calculate_skillmod,
+# which for this hero table costs about the same as a lookup.
+
+FORMATION_TABLE_DIR = os.getenv("FORMATION_TABLE", "formation_table")
+FORMATION_TABLE_SLOTS = 6
+FORMATION_TABLE_COLUMNS = ("skillmod", "damage_pct", "taken_pct", "damageup", "defenseup",
+                           "oppdefensedown", "oppdamagedown", "size", "counts",
+                           "order_attack", "order_garrison")
+
+
+def _binomial_table(n, k):
+    table = [[0] * (k + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        table[i][0] = 1
+        for j in range(1, min(i, k) + 1):
+            table[i][j] = table[i - 1][j - 1] + (table[i - 1][j] if j <= i - 1 else 0)
+    return table
+
+
+class FormationTable:
+    """Column files for every formation of up to `slots` heroes, indexed by rank."""
+
+    def __init__(self, path, meta, columns):
+        self.path = path
+        self.slots = meta["slots"]
+        self.heroes = meta["heroes"]
+        self.hero_index = {h: i for i, h in enumerate(self.heroes)}
+        self.size_offsets = meta["size_offsets"]
+        self.columns = columns
+        self.binom = _binomial_table(len(self.heroes) + self.slots, self.slots)
+
+    @classmethod
+    def load(cls, path=FORMATION_TABLE_DIR):
+        """Map the table at `path`; None if it is missing or built from other hero data."""
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("hero_data") != hero_data_fingerprint() or meta.get("heroes") != list(HERO_DATA):
+            print(f"⚠️ {path} was built from different hero data; "
+                  "run tools/build_formation_table.py to rebuild it")
+            return None
+        # Plain ndarray views of the maps: same shared pages, cheaper scalar reads.
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r").view(np.ndarray)
+                   for name in FORMATION_TABLE_COLUMNS}
+        return cls(path, meta, columns)
+
+    @staticmethod
+    def row_count(heroes, slots):
+        """Formations of 0..slots heroes = multisets of exactly `slots` over heroes + an empty slot."""
+        return _binomial_table(heroes + slots, slots)[heroes + slots][slots]
+
+    def rank(self, hero_counts):
+        """
+        Combinatorial rank of a team, or None if it is not in the table.
+        The team is padded with empty slots (symbol 0) to exactly `slots`
+        symbols x_1 <= ... <= x_s; y_k = x_k + k - 1 is then a strictly
+        increasing s-subset and its colex rank is sum(C(y_k, k)).
+        """
+        symbols = []
+        for hero, count in hero_counts.items():
+            i = self.hero_index.get(hero)
+            if i is None:
+                return None
+            if count:
+                symbols.append((i + 1, count))
+        total = sum(c for _, c in symbols)
+        if total > self.slots:
+            return None
+        symbols.sort()
+        # The empty-slot padding comes first and adds C(k - 1, k) = 0 each.
+        binom = self.binom
+        r, k = 0, self.slots - total + 1
+        for symbol, count in symbols:
+            for _ in range(count):
+                r += binom[symbol + k - 1][k]
+                k += 1
+        return r
+
+    def lookup(self, hero_counts):
+        """calculate_skillmod-shaped result read from the table, or None if not covered."""
+        r = self.rank(hero_counts)
+        if r is None:
+            return None
+        c = self.columns
+        per_op = defaultdict(float)
+        for hero, count in hero_counts.items():
+            for (cat, op, pct) in HERO_DATA[hero]:
+                per_op[(cat, op)] += pct * count
+        taken_pct = c["taken_pct"].item(r)
+        return {
+            "SkillMod": c["skillmod"].item(r),
+            "Damage%Increase": c["damage_pct"].item(r),
+            "FinalDamageTakenMultiplier": 1.0 + taken_pct / 100.0,
+            "DamageTaken%Change": taken_pct,
+            "components": {
+                "per_op": per_op,
+                "DamageUpFactor": c["damageup"].item(r),
+                "DefenseUpFactor": c["defenseup"].item(r),
+                "OppDefenseDownFactor": c["oppdefensedown"].item(r),
+                "OppDamageDownFactor": c["oppdamagedown"].item(r),
+            },
+        }
+
+    def ranked(self, size):
+        """RankedFormations-compatible view of the formations of exactly `size` heroes."""
+        return FormationTableRanking(self, size)
+
+
+class FormationTableRanking:
+    """Pages straight off the presorted order columns; nothing is copied or rebuilt."""
+
+    def __init__(self, table, size):
+        self.table = table
+        self.start, self.stop = table.size_offsets[size], table.size_offsets[size + 1]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def expired(self, now):
+        return False
+
+    def page(self, objective, start, count):
+        c = self.table.columns
+        lo = self.start + start
+        rows = c[f"order_{objective}"][lo:min(lo + count, self.stop)]
+        sets = []
+        for r in rows:
+            sets.append({
+                "heroes": {self.table.heroes[h]: int(n) for h, n in enumerate(c["counts"][r]) if n},
+                "skillmod": float(c["skillmod"][r]),
+                "damage_pct": float(c["damage_pct"][r]),
+                "taken_pct": float(c["taken_pct"][r]),
+            })
+        return sets
+
+
+def write_formation_table(path=FORMATION_TABLE_DIR, slots=FORMATION_TABLE_SLOTS):
+    """Score every formation of 0..slots heroes with calculate_skillmod and write the columns."""
+    heroes = list(HERO_DATA)
+    rows = FormationTable.row_count(len(heroes), slots)
+    table = FormationTable(path, {"slots": slots, "heroes": heroes, "size_offsets": []}, {})
+    cols = {name: np.zeros(rows) for name in FORMATION_TABLE_COLUMNS[:7]}
+    cols["size"] = np.zeros(rows, dtype=np.int8)
+    cols["counts"] = np.zeros((rows, len(heroes)), dtype=np.int8)
+
+    for size in range(slots + 1):
+        for counts in formation_count_matrix({h: size for h in heroes}, size):
+            team = {heroes[h]: int(n) for h, n in enumerate(counts) if n}
+            r = table.rank(team)
+            res = calculate_skillmod(team)
+            parts = res["components"]
+            cols["skillmod"][r] = res["SkillMod"]
+            cols["damage_pct"][r] = res["Damage%Increase"]
+            cols["taken_pct"][r] = res["DamageTaken%Change"]
+            cols["damageup"][r] = parts["DamageUpFactor"]
+            cols["defenseup"][r] = parts["DefenseUpFactor"]
+            cols["oppdefensedown"][r] = parts["OppDefenseDownFactor"]
+            cols["oppdamagedown"][r] = parts["OppDamageDownFactor"]
+            cols["size"][r] = size
+            cols["counts"][r] = counts
+
+    # Same orderings as RankedFormations; ties fall back to rank order.
+    row_ids = np.arange(rows)
+    cols["order_attack"] = np.lexsort((row_ids, -cols["damage_pct"], cols["size"])).astype(np.int32)
+    cols["order_garrison"] = np.lexsort((row_ids, cols["taken_pct"], cols["size"])).astype(np.int32)
+    size_offsets = np.searchsorted(np.sort(cols["size"]), np.arange(slots + 2)).tolist()
+
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in FORMATION_TABLE_COLUMNS:
+        np.save(os.path.join(tmp, f"{name}.npy"), cols[name])
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"hero_data": hero_data_fingerprint(), "heroes": heroes, "slots": slots,
+                   "rows": rows, "size_offsets": size_offsets}, f)
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return rows
+
+
+formation_table = FormationTable.load()
+
+
 # ---------------------------
 # Bot setup
 # ---------------------------
 
 intents = discord.Intents.default()
+# runner.py also hosts main.py's `!` commands on this bot; those need the
+# privileged Message Content intent, so it is only requested there.
+intents.message_content = os.getenv("PREFIX_COMMANDS") == "1"
 bot = commands.Bot(command_prefix="!", intents=intents)
 tree = bot.tree
 
@@ -351,16 +1445,142 @@ for gid in GUILD_IDS.split(","):
 GUILDS_PARAM = GUILDS if GUILDS else None
 
 
+# ---------------------------
+# Interaction trace recording (opt-in)
+# ---------------------------
+# Set TRACE_FILE=traces/prod.jsonl to append every slash command and
+# autocomplete request as one JSON line (command, options, arrival time).
+# User and guild IDs are replaced by salted hashes; set TRACE_SALT to keep
+# the same pseudonyms across restarts. Replay with tools/replay.py.
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_SALT = os.getenv("TRACE_SALT") or os.urandom(16).hex()
+_trace_fh = None
+
+
+def anonymize_id(value):
+    if value is None:
+        return None
+    return hashlib.sha256(f"{TRACE_SALT}:{value}".encode()).hexdigest()[:16]
+
+
+def flatten_options(options):
+    """Flatten interaction option payloads (incl. subcommands) to {name: value}; also return the focused name."""
+    values, focused = {}, None
+    for opt in options or []:
+        if "options" in opt:
+            sub_values, sub_focused = flatten_options(opt["options"])
+            values.update(sub_values)
+            focused = focused or sub_focused
+        elif "value" in opt:
+            values[opt["name"]] = opt["value"]
+            if opt.get("focused"):
+                focused = opt["name"]
+    return values, focused
+
+
+def trace_record(interaction: discord.Interaction):
+    global _trace_fh
+    if interaction.type == discord.InteractionType.application_command:
+        kind = "command"
+    elif interaction.type == discord.InteractionType.autocomplete:
+        kind = "autocomplete"
+    else:
+        return
+    data = interaction.data or {}
+    options, focused = flatten_options(data.get("options"))
+    entry = {
+        "ts": round(time.time(), 6),
+        "kind": kind,
+        "command": data.get("name"),
+        "options": options,
+        "user": anonymize_id(interaction.user.id),
+        "guild": anonymize_id(interaction.guild_id),
+    }
+    if focused:
+        entry["focused"] = focused
+    if _trace_fh is None:
+        os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+        _trace_fh = open(TRACE_FILE, "a", buffering=1)
+    _trace_fh.write(json.dumps(entry) + "\n")
+
+
+@bot.listen("on_interaction")
+async def record_interaction(interaction: discord.Interaction):
+    if TRACE_FILE:
+        trace_record(interaction)
+
+
 # ---------------------------
 # Autocomplete helper
 # ---------------------------
+# Slots that make up a team in /skillmod; the other filled slots give the
+# context for ranking suggestions in the focused one.
+TEAM_SLOTS = [("hero1", "count1"), ("hero2", "count2"),
+              ("hero3", "count3"), ("hero4", "count4")]
+
+# Per hero: [(category, effect_op, pct, skillmod_sign, taken_sign)]
+_HERO_GAIN_EFFECTS = {
+    h: [(cat, op, pct, SKILLMOD_SIGN.get(cat, 0.0), TAKEN_SIGN.get(cat, 0.0))
+        for (cat, op, pct) in effects]
+    for h, effects in HERO_DATA.items()
+}
+
+
+def marginal_gains(per_op, hero, count):
+    """
+    Log-space change in SkillMod and in damage taken from adding `count` of
+    `hero` to a team with per-op sums `per_op`. Only the hero's own ops are
+    touched, since each category factor is a product of (1 + op_sum).
+    """
+    sm_gain = taken_gain = 0.0
+    for cat, op, pct, sm_sign, taken_sign in _HERO_GAIN_EFFECTS[hero]:
+        s = per_op.get((cat, op), 0.0)
+        delta = log1p(s + pct * count) - log1p(s)
+        sm_gain += sm_sign * delta
+        taken_gain += taken_sign * delta
+    return sm_gain, taken_gain
+
+
 async def hero_autocomplete(interaction: discord.Interaction, current: str):
-    current = current or ""
-    choices = [
-        app_commands.Choice(name=h, value=h) for h in HERO_NAMES
-        if current.lower() in h.lower()
-    ]
-    return choices[:25]
+    current = (current or "").lower()
+    matches = [h for h in HERO_NAMES if current in h.lower()]
+
+    _, focused = flatten_options((interaction.data or {}).get("options"))
+    namespace = interaction.namespace
+    per_op = defaultdict(float)
+    count = 0
+    for hero_opt, count_opt in TEAM_SLOTS:
+        # An unset count is the command's default of 1; like parse_pairs_input,
+        # slots with a count of 0 or less don't join the team.
+        slot_count = getattr(namespace, count_opt, None)
+        slot_count = 1 if slot_count is None else slot_count
+        if hero_opt == focused:
+            count = slot_count
+            continue
+        if slot_count <= 0:
+            continue
+        hero = normalize_hero_name(getattr(namespace, hero_opt, None) or "", HERO_NAME_INDEX)
+        if hero:
+            for (cat, op, pct) in HERO_DATA[hero]:
+                per_op[(cat, op)] += pct * slot_count
+
+    if count <= 0:
+        # Not a team slot (e.g. /hero name), or one whose count drops it from
+        # the team: plain alphabetical matches.
+        return [app_commands.Choice(name=h, value=h) for h in matches[:25]]
+
+    # Rank by the bigger of: SkillMod gained, or damage taken reduced.
+    ranked = []
+    for h in matches:
+        sm_gain, taken_gain = marginal_gains(per_op, h, count)
+        if sm_gain >= -taken_gain:
+            label = f"{h} — {(exp(sm_gain) - 1) * 100:+.1f}% SkillMod"
+        else:
+            label = f"{h} — {(exp(taken_gain) - 1) * 100:+.1f}% damage taken"
+        ranked.append((-max(sm_gain, -taken_gain), h, label))
+    ranked.sort()
+    return [app_commands.Choice(name=label, value=h) for _, h, label in ranked[:25]]
 
 
 # ---------------------------
@@ -457,6 +1677,191 @@ def build_skillmod_embed(username, hero_counts, result):
     return embed
 
 
+# ---------------------------
+# Admission control for heavy jobs
+# ---------------------------
+# Heavy work (full formation searches, large sensitivity/sweep batches) runs
+# on its own small thread pool behind a scheduler: a user may have
+# HEAVY_PER_USER jobs in flight, a guild HEAVY_PER_GUILD running at once, and
+# waiting jobs are started round-robin across guilds. When the queue is full
+# the job is rejected straight away ("busy, try again") instead of timing
+# out. Cheap commands never go through here, so they are not stuck behind a
+# few big /recommend rosters.
+
+HEAVY_MAX_RUNNING = 2
+HEAVY_MAX_QUEUED = 16
+HEAVY_PER_USER = 1
+HEAVY_PER_GUILD = 1
+BUSY_MESSAGE = "⏳ The bot is busy with other big calculations — please try again in a moment."
+
+
+class SchedulerBusy(Exception):
+    """Raised immediately when a heavy job cannot be admitted."""
+
+
+class AdmissionScheduler:
+    def __init__(self, max_running=HEAVY_MAX_RUNNING, max_queued=HEAVY_MAX_QUEUED,
+                 per_user=HEAVY_PER_USER, per_guild=HEAVY_PER_GUILD):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.per_user = per_user
+        self.per_guild = per_guild
+        self.executor = ThreadPoolExecutor(max_workers=max_running,
+                                           thread_name_prefix="heavy")
+        self.running = 0
+        self.queued = 0
+        self.user_jobs = defaultdict(int)     # running + queued, per user
+        self.guild_running = defaultdict(int)
+        self.waiting = OrderedDict()          # guild -> deque of tickets, in arrival order
+        self.served = {}                      # guild -> turn stamp, lowest goes next
+        self.serve_clock = 0
+
+    async def run(self, user_id, guild_id, fn):
+        """Run sync `fn` on the heavy pool once admitted; raises SchedulerBusy if it can't be."""
+        guild_key = guild_id if guild_id is not None else f"dm:{user_id}"
+        if self.user_jobs.get(user_id, 0) >= self.per_user:
+            raise SchedulerBusy("You already have a big calculation running — wait for it to finish.")
+        if self.queued >= self.max_queued:
+            raise SchedulerBusy(BUSY_MESSAGE)
+
+        ticket = asyncio.get_running_loop().create_future()
+        # A guild that becomes active queues just ahead of the guild served
+        # last, i.e. behind every guild that was already waiting.
+        self.served.setdefault(guild_key, self.serve_clock - 0.5)
+        self.waiting.setdefault(guild_key, deque()).append(ticket)
+        self.queued += 1
+        self.user_jobs[user_id] += 1
+        self._dispatch()
+        try:
+            await ticket
+        except asyncio.CancelledError:
+            if not ticket.done() or ticket.cancelled():
+                self._drop(guild_key, ticket)
+                self._release_user(user_id)
+                raise
+            self._finish(user_id, guild_key)  # admitted just as we were cancelled
+            raise
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn)
+        finally:
+            self._finish(user_id, guild_key)
+
+    def _dispatch(self):
+        # Start waiting jobs while there is capacity. Each one goes to the
+        # eligible guild with the lowest stamp; starting a job moves its guild
+        # behind every other active guild, even if its queue empties and refills
+        # in between. Stamps only grow, so no waiting guild is passed forever.
+        while self.running < self.max_running:
+            eligible = [g for g in self.waiting if self.guild_running.get(g, 0) < self.per_guild]
+            if not eligible:
+                return
+            guild_key = min(eligible, key=self.served.__getitem__)
+            tickets = self.waiting[guild_key]
+            ticket = tickets.popleft()
+            if not tickets:
+                del self.waiting[guild_key]
+            self.serve_clock += 1
+            self.served[guild_key] = self.serve_clock
+            self.queued -= 1
+            self.running += 1
+            self.guild_running[guild_key] += 1
+            ticket.set_result(None)
+
+    def _forget_idle(self, guild_key):
+        if guild_key not in self.waiting and guild_key not in self.guild_running:
+            self.served.pop(guild_key, None)
+
+    def _drop(self, guild_key, ticket):
+        tickets = self.waiting.get(guild_key)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self.queued -= 1
+            if not tickets:
+                del self.waiting[guild_key]
+                self._forget_idle(guild_key)
+
+    def _release_user(self, user_id):
+        self.user_jobs[user_id] -= 1
+        if self.user_jobs[user_id] <= 0:
+            del self.user_jobs[user_id]
+
+    def _finish(self, user_id, guild_key):
+        self.running -= 1
+        self.guild_running[guild_key] -= 1
+        if self.guild_running[guild_key] <= 0:
+            del self.guild_running[guild_key]
+            self._forget_idle(guild_key)
+        self._release_user(user_id)
+        self._dispatch()
+
+
+heavy_jobs = AdmissionScheduler()
+
+
+# ---------------------------
+# Acknowledgement strategy
+# ---------------------------
+# Discord needs an initial response within 3 s. Deferring first and then
+# sending a followup costs two round trips, so handlers that may be slow
+# compute first and only defer when the work runs past ACK_BUDGET.
+
+ACK_BUDGET = 1.5  # seconds; leaves room for the send itself inside the 3 s window
+COMPUTE_ERROR_MESSAGE = "❌ Something went wrong working that out. Please try again later."
+
+
+def log_compute_failure(interaction, error):
+    command = getattr(interaction, "command", None)
+    print(f"❌ /{command.name if command else '?'} failed:", repr(error))
+
+
+async def respond_adaptive(interaction: discord.Interaction, compute, render=None, *,
+                           ephemeral=False, budget=ACK_BUDGET, heavy=True):
+    """
+    compute: zero-arg callable doing the work; heavy=True runs it on the
+    heavy_jobs pool (admission controlled), heavy=False runs it inline.
+    render: turns its result into send kwargs (content/embed/view) on the
+    event loop (views must be created there); omit if compute returns them.
+    Replies in one call if compute finishes within `budget`, otherwise defers
+    (thinking) and sends the result as a followup. If compute or render
+    raises, the user gets an ephemeral error instead of a stuck interaction.
+    """
+    def reply_for(result):
+        return render(result) if render else result
+
+    if not heavy:
+        try:
+            reply = reply_for(compute())
+        except Exception as e:
+            log_compute_failure(interaction, e)
+            await interaction.response.send_message(COMPUTE_ERROR_MESSAGE, ephemeral=True)
+            return
+        await interaction.response.send_message(ephemeral=ephemeral, **reply)
+        return
+
+    future = asyncio.ensure_future(
+        heavy_jobs.run(interaction.user.id, interaction.guild_id, compute))
+    try:
+        reply = reply_for(await asyncio.wait_for(asyncio.shield(future), budget))
+    except SchedulerBusy as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    except asyncio.TimeoutError:
+        await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        try:
+            reply = reply_for(await future)
+        except Exception as e:
+            log_compute_failure(interaction, e)
+            await interaction.followup.send(COMPUTE_ERROR_MESSAGE, ephemeral=True)
+            return
+        await interaction.followup.send(ephemeral=ephemeral, **reply)
+        return
+    except Exception as e:
+        log_compute_failure(interaction, e)
+        await interaction.response.send_message(COMPUTE_ERROR_MESSAGE, ephemeral=True)
+        return
+    await interaction.response.send_message(ephemeral=ephemeral, **reply)
+
+
 # ---------------------------
 # Slash commands
 # ---------------------------
@@ -476,21 +1881,30 @@ async def help_skillmod(interaction: discord.Interaction):
 "   👉 Example: `/skillmod hero1:Chenko count1:2 hero2:Amane count2:2`\n"
 "• `/hero <name>` — Show hero buff type, effect_op, and contribution.\n"
 "   👉 Example: `/hero Hilde`\n"
-"• `/compare team_a:<string> team_b:<string>` — Compare two team setups.\n"
-"   👉 Example: `/compare team_a:Chenko:4 team_b:Amane:2,Chenko:2`\n\n"
+"• `/compare team_a:<string> team_b:<string> teams:<more>` — Rank up to 10 teams or saved presets side by side.\n"
+"   👉 Example: `/compare team_a:Chenko:4 team_b:Amane:2,Chenko:2 teams:AttackA; Hilde:2,Chenko:2`\n\n"
 
 "**💾 Preset Commands**\n"
 "• `/savepreset name:<name> heroes:<list>` — Save a team setup for later use.\n"
 "   👉 Example: `/savepreset name:AttackA heroes:Chenko:2,Amane:2`\n"
 "• `/loadpreset name:<name>` — Load and calculate a saved team.\n"
 "   👉 Example: `/loadpreset name:AttackA`\n"
-"• `/listpresets` — View all your saved team presets.\n\n"
+"• `/listpresets` — View all your saved team presets.\n"
+"• `/leaderboard` — Top presets saved in this server, plus your rank.\n\n"
 
 "**🤖 Recommendation Command**\n"
-"• `/recommend` — Suggests top 2 team formations for both Attack and Garrison.\n"
+"• `/recommend` — Ranks team formations for both Attack and Garrison; use ◀/▶ to page through them.\n"
 "   👉 `/recommend` — shows global best 4-hero setups.\n"
 "   👉 `/recommend heroes:Chenko:3,Amane:2,Hilde:1` — suggests best teams using only heroes you own.\n\n"
 
+"**🎲 What-if Commands**\n"
+"• `/sweep heroes:<ranges>` — Table or grid of SkillMod across hero counts.\n"
+"   👉 Example: `/sweep heroes:Chenko:0..4,Amane:0..4 total:4`\n"
+"• `/sensitivity ranges:<list>` — Re-rank teams when hero values are uncertain.\n"
+"   👉 Example: `/sensitivity ranges:Amane=0.20..0.30 teams:Chenko:2,Amane:2; Chenko:4`\n"
+"• `/counter enemy:<teams>` — Your best lineups against one or more enemy teams.\n"
+"   👉 Example: `/counter enemy:Gordon:2,Saul:2 objective:attack`\n\n"
+
 "**💡 Tips**\n"
 "• Mixing heroes with the same *effect* but **different effect_op** (e.g., Chenko & Amane) gives multiplicative stacking and higher SkillMod.\n"
 "• You can use `/hero` autocomplete to avoid typos.\n"
@@ -508,15 +1922,10 @@ async def help_skillmod(interaction: discord.Interaction):
 @app_commands.describe(name="Hero name")
 @app_commands.autocomplete(name=hero_autocomplete)
 async def slash_hero(interaction: discord.Interaction, name: str):
-    await interaction.response.defer(ephemeral=True)
     # normalize
-    matched = None
-    for h in HERO_DATA:
-        if h.lower() == name.lower():
-            matched = h
-            break
+    matched = normalize_hero_name(name, HERO_NAME_INDEX)
     if not matched:
-        await interaction.followup.send(
+        await interaction.response.send_message(
             f"Unknown hero `{name}`. Type `/help_skillmod` or check `/skillmod` autocomplete.",
             ephemeral=True)
         return
@@ -526,7 +1935,7 @@ async def slash_hero(interaction: discord.Interaction, name: str):
     for cat, op, pct in effects:
         lines.append(f"- **{cat}** (op{op}): {pct*100:.0f}%")
     text = f"**{matched}**\n" + "\n".join(lines)
-    await interaction.followup.send(text, ephemeral=True)
+    await interaction.response.send_message(text, ephemeral=True)
 
 
 # /skillmod with up to 4 hero slots (each optional). Autocomplete for each hero
@@ -557,7 +1966,6 @@ async def slash_skillmod(
     hero4: Optional[str] = None,
     count4: int = 1,
 ):
-    await interaction.response.defer()
     try:
         pairs = {
             hero1: count1,
@@ -567,18 +1975,18 @@ async def slash_skillmod(
         }
         normalized = parse_pairs_input(pairs)
     except KeyError as e:
-        await interaction.followup.send(
+        await interaction.response.send_message(
             f"Unknown hero `{e.args[0]}`. Use autocomplete or /help_skillmod.",
             ephemeral=True)
         return
     except Exception as e:
-        await interaction.followup.send(
+        await interaction.response.send_message(
             "Parse error. Use /help_skillmod for usage examples.",
             ephemeral=True)
         return
 
     if not normalized:
-        await interaction.followup.send(
+        await interaction.response.send_message(
             "No heroes provided. Use /skillmod and pick at least one hero.",
             ephemeral=True)
         return
@@ -587,54 +1995,106 @@ async def slash_skillmod(
     embed_result = adapt_skillmod_for_embed(res)
     embed = build_skillmod_embed(interaction.user.display_name, normalized,
                                  embed_result)
-    await interaction.followup.send(embed=embed)
+    await interaction.response.send_message(embed=embed)
+
+
+# /compare teams
+COMPARE_MAX_TEAMS = 10
+
+
+def split_team_list(s: str):
+    """Split several teams given as lines or separated by ';'."""
+    return [t.strip() for t in re.split(r"[;\n]", s or "") if t.strip()]
+
+
+def resolve_compare_teams(entries, user_presets):
+    """
+    entries: list of (label, text). A text equal to one of the user's preset
+    names (case-insensitive) is replaced by that preset and labelled with it.
+    Returns [(label, text, hero_counts)]; parse errors propagate.
+    """
+    by_name = {n.lower(): (n, s) for n, s in user_presets.items()}
+    teams = []
+    for label, text in entries:
+        preset = by_name.get(text.strip().lower())
+        if preset:
+            label, text = preset
+        teams.append((label, text, parse_compact_string(text)))
+    return teams
+
+
+def format_compare_table(labels, scores):
+    """Ranked by SkillMod, with deltas from the best team for both metrics."""
+    best_sm = max(s["skillmod"] for s in scores)
+    best_taken = min(s["taken_pct"] for s in scores)
+    order = sorted(range(len(scores)), key=lambda i: (-scores[i]["skillmod"], scores[i]["taken_pct"]))
+    width = min(max(len(l) for l in labels), 16)
+    lines = [f"{'#':>2} {'Team':<{width}} {'SkillMod':>8} {'Δ best':>7} {'Taken':>7} {'Δ best':>7}"]
+    for rank, i in enumerate(order, 1):
+        s = scores[i]
+        d_sm = (s["skillmod"] - best_sm) / best_sm * 100 if best_sm else 0.0
+        d_tk = s["taken_pct"] - best_taken
+        lines.append(f"{rank:>2} {labels[i][:width]:<{width}} {s['skillmod']:>7.3f}× {d_sm:>+6.1f}% "
+                     f"{s['taken_pct']:>+6.1f}% {d_tk:>+5.1f}pp")
+    return "```\n" + "\n".join(lines) + "\n```"
+
+
+def compare_winners(labels, scores, key, best):
+    """Label(s) holding the best value of `key` ('max' or 'min'), ties joined."""
+    values = [s[key] for s in scores]
+    target = max(values) if best == "max" else min(values)
+    winners = [labels[i] for i, v in enumerate(values) if abs(v - target) < 1e-9]
+    return " / ".join(winners) if len(winners) < len(labels) else "Tie"
 
 
-# /compare team_a team_b
 @tree.command(name="compare",
-              description="Compare two teams. Use format: Chenko:4,Amane:2", guilds=GUILDS_PARAM)
-@app_commands.describe(team_a="Team A (e.g. Chenko:4,Amane:2)",
-                       team_b="Team B (e.g. Chenko:2,Amane:2)")
+              description="Compare and rank teams. Use format: Chenko:4,Amane:2", guilds=GUILDS_PARAM)
+@app_commands.describe(team_a="Team A (e.g. Chenko:4,Amane:2) or one of your preset names",
+                       team_b="Team B (e.g. Chenko:2,Amane:2) or one of your preset names",
+                       teams=f"(Optional) More teams or preset names, one per line or separated by ';' "
+                             f"(up to {COMPARE_MAX_TEAMS} in total)")
 async def slash_compare(interaction: discord.Interaction, team_a: str,
-                        team_b: str):
-    await interaction.response.defer()
+                        team_b: Optional[str] = None, teams: Optional[str] = None):
+    texts = split_team_list(team_a) + split_team_list(team_b) + split_team_list(teams)
+    if len(texts) < 2:
+        await interaction.response.send_message(
+            "Give at least two teams to compare.", ephemeral=True)
+        return
+    if len(texts) > COMPARE_MAX_TEAMS:
+        await interaction.response.send_message(
+            f"Compare at most {COMPARE_MAX_TEAMS} teams at once.", ephemeral=True)
+        return
+
+    entries = [(f"Team {chr(ord('A') + i)}", t) for i, t in enumerate(texts)]
+    user_presets = load_all_presets().get(str(interaction.user.id), {})
     try:
-        a = parse_compact_string(team_a)
-        b = parse_compact_string(team_b)
+        resolved = resolve_compare_teams(entries, user_presets)
     except KeyError as e:
-        await interaction.followup.send(
+        await interaction.response.send_message(
             f"Unknown hero `{e.args[0]}` in input. Use /help_skillmod.",
             ephemeral=True)
         return
-    except Exception as e:
-        await interaction.followup.send(
-            "Parse error. Use format: Chenko:4,Amane:2", ephemeral=True)
+    except TeamParseError as e:
+        await interaction.response.send_message(
+            describe_parse_error(e) + "\nUse format: Chenko:4,Amane:2", ephemeral=True)
         return
 
-    ra = calculate_skillmod(a)
-    rb = calculate_skillmod(b)
-    va = ra["SkillMod"]
-    vb = rb["SkillMod"]
-    delta = (vb - va) / va * 100 if va != 0 else 0.0
-    winner = "Team B" if vb > va else ("Team A" if va > vb else "Tie")
+    labels = [label for label, _, _ in resolved]
+    scores = score_hero_counts_batch([counts for _, _, counts in resolved])
 
     embed = discord.Embed(title="Team Comparison", color=discord.Color.teal())
     embed.add_field(
-        name="Team A",
-        value=
-        f"`{team_a}`\nSkillMod: `{va:.4f}`\nDamage: `+{ra['Damage%Increase']:.1f}%`",
-        inline=True)
-    embed.add_field(
-        name="Team B",
-        value=
-        f"`{team_b}`\nSkillMod: `{vb:.4f}`\nDamage: `+{rb['Damage%Increase']:.1f}%`",
-        inline=True)
+        name="Teams",
+        value="\n".join(f"**{label}**: `{text}`" for label, text, _ in resolved)[:1024],
+        inline=False)
+    embed.add_field(name="Ranking", value=format_compare_table(labels, scores)[:1024],
+                    inline=False)
     embed.add_field(
         name="Result",
-        value=
-        f"{winner} wins (Team B is {delta:.1f}% {'higher' if delta>0 else 'lower'} than Team A)",
+        value=(f"💥 Most damage dealt: **{compare_winners(labels, scores, 'skillmod', 'max')}**\n"
+               f"🛡️ Least damage taken: **{compare_winners(labels, scores, 'taken_pct', 'min')}**"),
         inline=False)
-    await interaction.followup.send(embed=embed)
+    await interaction.response.send_message(embed=embed)
 
 
 # /savepreset name: <username> heroes: <hero name>:<hero count>, <hero name>: <hero count>
@@ -643,12 +2103,19 @@ async def slash_compare(interaction: discord.Interaction, team_a: str,
                        heroes="Heroes list, e.g. Chenko:4,Amane:2")
 async def savepreset(interaction: discord.Interaction, name: str, heroes: str):
     try:
-        _ = parse_compact_string(heroes)  # validate
-    except Exception as e:
+        hero_counts = parse_compact_string(heroes)  # validate
+    except UnknownHeroError as e:
+        await interaction.response.send_message(
+            f"Unknown hero `{e.name}`. Use /help_skillmod.", ephemeral=True)
+        return
+    except TeamParseError as e:
         await interaction.response.send_message(
-            "Invalid format. Use `Hero:count,Hero:count`.", ephemeral=True)
+            describe_parse_error(e) + "\nUse `Hero:count,Hero:count`.", ephemeral=True)
         return
     save_user_preset(str(interaction.user.id), name, heroes)
+    guild_id = str(interaction.guild_id) if interaction.guild_id else None
+    get_preset_leaderboards().update(str(interaction.user.id), name,
+                                     hero_counts, guild_id)
     await interaction.response.send_message(f"✅ Preset `{name}` saved!",
                                             ephemeral=True)
 
@@ -692,70 +2159,366 @@ async def listpresets(interaction: discord.Interaction):
                                             ephemeral=True)
 
 
+# /leaderboard
+@tree.command(name="leaderboard",
+              description="Top saved presets in this server", guilds=GUILDS_PARAM)
+@app_commands.describe(
+    objective="Rank by attack (SkillMod / damage dealt) or garrison (damage taken)",
+    top=f"How many presets to show (max {LEADERBOARD_SIZE * 2})",
+)
+@app_commands.choices(objective=[
+    app_commands.Choice(name="attack", value="attack"),
+    app_commands.Choice(name="garrison", value="garrison"),
+])
+async def leaderboard(interaction: discord.Interaction, objective: str = "attack",
+                      top: int = LEADERBOARD_SIZE):
+    if not interaction.guild_id:
+        await interaction.response.send_message(
+            "Leaderboards are per server — run this inside a server.", ephemeral=True)
+        return
+    guild_id = str(interaction.guild_id)
+    boards = get_preset_leaderboards()
+    board = boards.board(guild_id)
+    if not board:
+        await interaction.response.send_message(
+            "No presets saved in this server yet. Use /savepreset.", ephemeral=True)
+        return
+
+    top = max(1, min(top, LEADERBOARD_SIZE * 2))
+    lines = []
+    for i, (user_id, name) in enumerate(board.top(objective, top), 1):
+        entry = boards.entries[user_id][name]
+        lines.append(
+            f"**{i}.** <@{user_id}> — `{name}` · SkillMod `{entry['skillmod']:.3f}×` "
+            f"(💥 `{entry['damage_pct']:+.1f}%`, 🛡️ `{entry['taken_pct']:+.1f}%`)")
+
+    embed = discord.Embed(
+        title="🏆 Preset Leaderboard — " + ("Attack" if objective == "attack" else "Garrison"),
+        description="\n".join(lines),
+        color=discord.Color.gold(),
+    )
+    mine = boards.user_best(guild_id, objective, str(interaction.user.id))
+    if mine:
+        embed.set_footer(text=f"Your best: #{mine[0]} of {len(board)} ({mine[1]})")
+    else:
+        embed.set_footer(text=f"{len(board)} presets ranked · save one with /savepreset")
+    await interaction.response.send_message(embed=embed)
+
+
 # /recommend
+FORMATION_PAGE_SIZE = 5
+EMPTY_ROSTER_MESSAGE = "No heroes in roster — give at least one hero with a count above 0, e.g. Chenko:3,Amane:2."
+
+
+class FormationPager(discord.ui.View):
+    """Prev/Next buttons paging through a RankedFormations index."""
+
+    def __init__(self, ranked, roster_note, owner_id, page_size=FORMATION_PAGE_SIZE):
+        super().__init__(timeout=600)
+        self.ranked = ranked
+        self.roster_note = roster_note
+        self.owner_id = owner_id
+        self.page_size = page_size
+        self.page = 0
+        self.last_page = max(0, (len(ranked) - 1) // page_size)
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.last_page
+
+    def build_embed(self):
+        start = self.page * self.page_size
+        embed = discord.Embed(
+            title="🔥 Recommended Formations",
+            description=self.roster_note,
+            color=discord.Color.gold(),
+        )
+        embed.add_field(
+            name="💥 Attack Focus (Damage Output)",
+            value=format_formations(
+                self.ranked.page("attack", start, self.page_size), start + 1),
+            inline=False,
+        )
+        embed.add_field(
+            name="🛡️ Garrison Focus (Damage Reduction)",
+            value=format_formations(
+                self.ranked.page("garrison", start, self.page_size), start + 1),
+            inline=False,
+        )
+        embed.set_footer(
+            text=f"Page {self.page + 1}/{self.last_page + 1} · {len(self.ranked)} formations ranked")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message(
+                "Only the person who ran /recommend can page these results.",
+                ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.last_page, self.page + 1)
+        await self._show(interaction)
+
+
 @tree.command(
     name="recommend",
     description="Suggest best joiner setups for attack and garrison", guilds=GUILDS_PARAM
 )
 @app_commands.describe(
-    heroes="(Optional) List your available heroes, e.g., Chenko:3,Amane:2"
+    heroes="(Optional) List your available heroes, e.g., Chenko:3,Amane:2",
+    slots=f"(Optional) Heroes per formation (default {FORMATION_SLOTS}, max {MAX_FORMATION_SLOTS})",
 )
-async def recommend(interaction: discord.Interaction, heroes: str = None):
-    await interaction.response.defer(thinking=True)
-
-    cache = load_recommend_cache()
-    now = datetime.now(timezone.utc)
-
+async def recommend(interaction: discord.Interaction, heroes: str = None,
+                    slots: int = FORMATION_SLOTS):
+    slots = max(1, min(slots, MAX_FORMATION_SLOTS))
+    roster_counts = None
     if heroes:
         try:
             roster_counts = parse_roster_string(heroes)
-        except ValueError as e:
-            await interaction.followup.send(str(e), ephemeral=True)
+        except UnknownHeroError as e:
+            await interaction.response.send_message(
+                f"Unknown hero `{e.name}` in roster. Use /help_skillmod.",
+                ephemeral=True)
+            return
+        except TeamParseError as e:
+            await interaction.response.send_message(describe_parse_error(e), ephemeral=True)
+            return
+        if not roster_counts:
+            await interaction.response.send_message(EMPTY_ROSTER_MESSAGE, ephemeral=True)
             return
-        best_attack, best_garrison = get_best_formations(roster_counts)
         roster_note = f"*(Based on your roster: {heroes})*"
     else:
-        if "timestamp" in cache:
-            ts = datetime.fromisoformat(cache["timestamp"])
-            if now - ts < timedelta(days=1):
-                best_attack = cache["best_attack"]
-                best_garrison = cache["best_garrison"]
-            else:
-                best_attack, best_garrison = get_best_formations()
-                cache = {
-                    "timestamp": now.isoformat(),
-                    "best_attack": best_attack,
-                    "best_garrison": best_garrison,
-                }
-                save_recommend_cache(cache)
-        else:
-            best_attack, best_garrison = get_best_formations()
-            cache = {
-                "timestamp": now.isoformat(),
-                "best_attack": best_attack,
-                "best_garrison": best_garrison,
-            }
-            save_recommend_cache(cache)
         roster_note = "*(Based on all heroes — cached global best)*"
 
+    def render(ranked):
+        view = FormationPager(ranked, roster_note, interaction.user.id)
+        return {"embed": view.build_embed(), "view": view}
+
+    # Cache hit: microseconds, answered inline. Cache miss: a full build or
+    # search, which goes through heavy-job admission.
+    cached = cached_ranked_formations(roster_counts, max_size=slots)
+    if cached is not None:
+        await respond_adaptive(interaction, lambda: cached, render, heavy=False)
+        return
+    await respond_adaptive(
+        interaction, lambda: get_ranked_formations(roster_counts, max_size=slots), render)
+
+
+# /sweep
+@tree.command(
+    name="sweep",
+    description="Evaluate a range of hero counts (1-D table or 2-D grid) in one go", guilds=GUILDS_PARAM
+)
+@app_commands.describe(
+    heroes="Heroes and count ranges, e.g. Chenko:1..6 or Chenko:0..4,Amane:0..4",
+    base="(Optional) Fixed heroes added to every cell, e.g. Hilde:1",
+    objective="Highlight best attack (SkillMod) or garrison (damage taken)",
+    total="(Optional) Only consider cells with exactly this many heroes in total",
+)
+@app_commands.choices(objective=[
+    app_commands.Choice(name="attack", value="attack"),
+    app_commands.Choice(name="garrison", value="garrison"),
+])
+async def sweep(interaction: discord.Interaction, heroes: str,
+                base: Optional[str] = None, objective: str = "attack",
+                total: Optional[int] = None):
+    try:
+        axes = parse_sweep_axes(heroes)
+        base_counts = parse_compact_string(base) if base else {}
+    except KeyError as e:
+        await interaction.response.send_message(
+            f"Unknown hero `{e.args[0]}` in input. Use /help_skillmod.",
+            ephemeral=True)
+        return
+    except ValueError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+
+    cells = prod(len(counts) for _, counts in axes)
+    await respond_adaptive(
+        interaction, lambda: sweep_reply(axes, base_counts, base, objective, total),
+        heavy=cells > SWEEP_INLINE_CELLS)
+
+
+def sweep_reply(axes, base_counts, base, objective, total):
+    skillmod, taken, totals = sweep_grid(axes, base_counts)
+    best = best_sweep_cell(skillmod, taken, totals, objective, total)
+
+    if best is None:
+        best_line = f"No cell has exactly {total} heroes."
+    else:
+        team = dict(base_counts)
+        for d, (hero, counts) in enumerate(axes):
+            team[hero] = team.get(hero, 0) + counts[best[d]]
+        team_text = ", ".join(f"{h}×{c}" for h, c in team.items() if c)
+        best_line = (f"**Best:** {team_text or 'no heroes'} — SkillMod `{skillmod[best]:.3f}×`, "
+                     f"Damage Taken `{(taken[best] - 1) * 100:+.1f}%`")
+
+    base_note = f" + fixed {base}" if base_counts else ""
     embed = discord.Embed(
-        title="🔥 Recommended Formations",
-        description=roster_note,
-        color=discord.Color.gold(),
-    )
-    embed.add_field(
-        name="💥 Attack Focus (Damage Output)",
-        value=format_formations(best_attack),
-        inline=False,
-    )
-    embed.add_field(
-        name="🛡️ Garrison Focus (Damage Reduction)",
-        value=format_formations(best_garrison),
-        inline=False,
+        title="📈 SkillMod Sweep",
+        description=(
+            f"*{' × '.join(f'{h} {c.start}..{c.stop - 1}' for h, c in axes)}{base_note}*\n"
+            + format_sweep(axes, skillmod, taken, totals, best, objective, total)
+            + "\n" + best_line),
+        color=discord.Color.green(),
     )
+    return {"embed": embed}
+
+
+# /sensitivity
+@tree.command(
+    name="sensitivity",
+    description="Check how stable team rankings are if hero values are uncertain", guilds=GUILDS_PARAM
+)
+@app_commands.describe(
+    ranges="Uncertain values, e.g. Amane=0.20..0.30, Saul@113=0.15~0.02",
+    teams="(Optional) Teams separated by ';', e.g. Chenko:4; Amane:2,Chenko:2",
+    objective="Rank for attack (SkillMod) or garrison (damage taken)",
+    samples=f"Number of sampled hero tables (max {SENSITIVITY_MAX_SAMPLES})",
+)
+@app_commands.choices(objective=[
+    app_commands.Choice(name="attack", value="attack"),
+    app_commands.Choice(name="garrison", value="garrison"),
+])
+async def sensitivity(interaction: discord.Interaction, ranges: str,
+                      teams: Optional[str] = None, objective: str = "attack",
+                      samples: int = SENSITIVITY_SAMPLES):
+    try:
+        parsed_ranges = parse_sensitivity_ranges(ranges)
+        team_list = [parse_compact_string(t) for t in split_team_list(teams)]
+    except KeyError as e:
+        await interaction.response.send_message(
+            f"Unknown hero `{e.args[0]}` in input. Use /help_skillmod.",
+            ephemeral=True)
+        return
+    except ValueError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+
+    if teams and not team_list:
+        await interaction.response.send_message("No teams provided.", ephemeral=True)
+        return
+    samples = max(100, min(samples, SENSITIVITY_MAX_SAMPLES))
+
+    def compute():
+        candidates = team_list or [s["heroes"] for s in
+                                   get_ranked_formations().page(objective, 0, 5)]
+        stats = run_sensitivity(candidates[:SENSITIVITY_MAX_TEAMS], parsed_ranges,
+                                samples=samples, objective=objective)
+        varied = ", ".join(
+            f"{EFFECT_KEYS[k][0]} op{EFFECT_KEYS[k][2]}: "
+            + (f"{a:.2f}..{b:.2f}" if kind == "uniform" else f"{a:.2f}~{b:.2f}")
+            for k, (kind, a, b) in parsed_ranges.items()) or "nothing (fixed values)"
+
+        embed = discord.Embed(
+            title="🎲 Sensitivity Analysis",
+            description=f"*{samples} sampled hero tables · varied: {varied}*",
+            color=discord.Color.purple(),
+        )
+        embed.add_field(
+            name="💥 Attack ranking" if objective == "attack" else "🛡️ Garrison ranking",
+            value=format_sensitivity(stats, objective)[:1024],
+            inline=False,
+        )
+        return {"embed": embed}
+
+    await respond_adaptive(interaction, compute)
+
+
+# /counter
+@tree.command(
+    name="counter",
+    description="Find your best formations against one or more enemy teams", guilds=GUILDS_PARAM
+)
+@app_commands.describe(
+    enemy="Enemy team(s) separated by ';', e.g. Gordon:2,Saul:2; Fahd:4",
+    heroes="(Optional) Your available heroes, e.g., Chenko:3,Amane:2",
+    objective="attack = deal the most damage, garrison = take the least",
+    slots=f"(Optional) Heroes per formation (default {FORMATION_SLOTS}, max {MAX_FORMATION_SLOTS})",
+)
+@app_commands.choices(objective=[
+    app_commands.Choice(name="attack", value="attack"),
+    app_commands.Choice(name="garrison", value="garrison"),
+])
+async def counter(interaction: discord.Interaction, enemy: str,
+                  heroes: Optional[str] = None, objective: str = "attack",
+                  slots: int = FORMATION_SLOTS):
+    slots = max(1, min(slots, MAX_FORMATION_SLOTS))
+    try:
+        enemies = [parse_compact_string(t) for t in split_team_list(enemy)]
+        roster_counts = parse_roster_string(heroes) if heroes else None
+    except UnknownHeroError as e:
+        await interaction.response.send_message(
+            f"Unknown hero `{e.name}` in input. Use /help_skillmod.", ephemeral=True)
+        return
+    except TeamParseError as e:
+        await interaction.response.send_message(describe_parse_error(e), ephemeral=True)
+        return
+
+    if roster_counts is not None and not roster_counts:
+        await interaction.response.send_message(EMPTY_ROSTER_MESSAGE, ephemeral=True)
+        return
+    enemies = [e for e in enemies if e]
+    if not enemies:
+        await interaction.response.send_message("No enemy team provided.", ephemeral=True)
+        return
+    if len(enemies) > COUNTER_MAX_ENEMIES:
+        await interaction.response.send_message(
+            f"Give at most {COUNTER_MAX_ENEMIES} enemy teams.", ephemeral=True)
+        return
+    if any(sum(e.values()) > COUNTER_MAX_ENEMY_HEROES for e in enemies):
+        await interaction.response.send_message(
+            f"An enemy team can have at most {COUNTER_MAX_ENEMY_HEROES} heroes.", ephemeral=True)
+        return
+
+    roster = ({name: slots for name in HERO_DATA.keys()} if roster_counts is None
+              else roster_counts)
+    candidates = count_formations([min(c, slots) for c in roster.values()], slots)
+    if candidates > FULL_INDEX_MAX_FORMATIONS:
+        await interaction.response.send_message(
+            f"That roster has {candidates:,} formations; narrow it down or use fewer slots.",
+            ephemeral=True)
+        return
+
+    def compute():
+        picks, n = counter_picks(enemies, roster_counts, objective, max_size=slots)
+        enemy_lines = "\n".join(
+            f"**{j}.** " + ", ".join(f"{h}×{c}" for h, c in e.items())
+            for j, e in enumerate(enemies, 1))
+        worst = " (worst case over all enemies)" if len(enemies) > 1 else ""
+        embed = discord.Embed(
+            title="⚔️ Counter Picks" if objective == "attack" else "🏰 Garrison Counter Picks",
+            description=f"*{n:,} formations of {slots} scored against {len(enemies)} enemy team(s){worst}*",
+            color=discord.Color.red(),
+        )
+        embed.add_field(name="👹 Enemy", value=enemy_lines[:1024], inline=False)
+        embed.add_field(
+            name="💥 Best attack picks" if objective == "attack" else "🛡️ Best garrison picks",
+            value=format_counter_picks(picks, enemies, objective)[:1024],
+            inline=False,
+        )
+        embed.set_footer(text="Dealt/Taken: damage multiplier vs a neutral matchup · edge = dealt ÷ taken. "
+                              "In this damage model the order of your picks is the same against any "
+                              "enemy; the enemy changes the margins and whether you come out ahead.")
+        return {"embed": embed}
+
+    await respond_adaptive(interaction, compute, heavy=candidates > COUNTER_INLINE_FORMATIONS)
+
 
-    await interaction.followup.send(embed=embed)
-    
 # --------------------------
 # Register / sync on ready
 # --------------------------
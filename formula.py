@@ -0,0 +1,168 @@
+# formula.py
+# The SkillMod formula as data, shared by both bots. compile_formula turns it
+# plus a hero table into a FormulaKernel: a generated scalar function with
+# one accumulator per (category, effect_op) the heroes actually use and the
+# category products unrolled, plus log-space weights for the numpy paths.
+# Categories no hero provides are folded to 1.0 at compile time and never
+# computed.
+
+# Stacking rules, per category:
+#   "per_op":   same effect_op adds, different ops multiply: prod(1 + sum_op)
+#   "additive": everything in the category adds: 1 + sum
+STACKING_RULES = ("per_op", "additive")
+
+SKILLMOD_FORMULA = {
+    "categories": {
+        "DamageUp": "per_op",
+        "DefenseUp": "per_op",
+        "OppDefenseDown": "per_op",
+        "OppDamageDown": "per_op",
+    },
+    # Each output is a product of category factors raised to these powers
+    # (integers are unrolled into multiplications, other powers use **).
+    "outputs": {
+        # SkillMod per article: (DamageUp * OppDefenseDown) / (OppDamageDown * DefenseUp)
+        "SkillMod": {"DamageUp": 1, "OppDefenseDown": 1, "DefenseUp": -1, "OppDamageDown": -1},
+        # Damage taken: DefenseUp and OppDamageDown (weaker enemy hits) both reduce it
+        "DamageTaken": {"DefenseUp": -1, "OppDamageDown": -1},
+        # Matchups: what a team does to the other side / what protects it
+        "Offense": {"DamageUp": 1, "OppDefenseDown": 1},
+        "Guard": {"DefenseUp": 1, "OppDamageDown": 1},
+    },
+}
+
+
+class FormulaKernel:
+    """A formula compiled against one hero table. Build with compile_formula."""
+
+    def __init__(self, formula, hero_data, op_keys, source, namespace):
+        self.formula = formula
+        self.categories = list(formula["categories"])
+        self.outputs = list(formula["outputs"])
+        self.op_keys = op_keys                # accumulator slots, (category, effect_op)
+        self.used_categories = sorted({cat for cat, _ in op_keys}, key=self.categories.index)
+        self.source = source                  # generated code, for debugging
+        self.raw_score = namespace["score"]   # hero_counts -> (sums, factors tuple, outputs tuple)
+        self.output_index = {name: i for i, name in enumerate(self.outputs)}
+
+    def score(self, hero_counts):
+        """(op_sums list, {category: factor}, {output: value}); KeyError on unknown heroes."""
+        sums, factors, outputs = self.raw_score(hero_counts)
+        return (sums, dict(zip(self.categories, factors)),
+                dict(zip(self.outputs, outputs)))
+
+    def per_op(self, sums):
+        """{(category, effect_op): sum} for the ops a team touched."""
+        return {key: s for key, s in zip(self.op_keys, sums) if s}
+
+    def log_weights(self, output):
+        """
+        {category: power} of `output`, restricted to categories in use. With
+        per_op stacking, log(output) = sum over ops of power * log1p(op_sum),
+        which is what the vectorized scorers rely on.
+        """
+        for cat in self.used_categories:
+            if self.formula["categories"][cat] != "per_op":
+                raise ValueError(f"{cat} uses {self.formula['categories'][cat]} stacking; "
+                                 "log-linear weights need per_op")
+        powers = self.formula["outputs"][output]
+        return {cat: float(p) for cat, p in powers.items() if cat in self.used_categories}
+
+
+def compile_formula(formula, hero_data):
+    """Generate and compile the scoring function for `formula` over `hero_data`."""
+    categories = formula["categories"]
+    for cat, rule in categories.items():
+        if rule not in STACKING_RULES:
+            raise ValueError(f"Unknown stacking rule {rule!r} for {cat}")
+    for name, powers in formula["outputs"].items():
+        unknown = set(powers) - set(categories)
+        if unknown:
+            raise ValueError(f"Output {name} uses undeclared categories {sorted(unknown)}")
+        for cat, p in powers.items():
+            if isinstance(p, bool) or not isinstance(p, (int, float)):
+                raise ValueError(f"Output {name} has a non-numeric power {p!r} for {cat}")
+
+    used = {(cat, op) for effects in hero_data.values() for (cat, op, _) in effects}
+    for cat in sorted({cat for cat, _ in used}):
+        if cat not in categories:
+            raise ValueError(f"Hero effect category {cat} is not in the formula")
+    op_keys = sorted(used, key=lambda k: (list(categories).index(k[0]), k[1]))
+    slot = {key: j for j, key in enumerate(op_keys)}
+    terms = {hero: tuple((slot[(cat, op)], pct) for (cat, op, pct) in effects)
+             for hero, effects in hero_data.items()}
+
+    lines = [
+        "def score(hero_counts):",
+        f"    s = [0.0] * {len(op_keys)}",
+        "    for hero, count in hero_counts.items():",
+        "        for j, pct in TERMS[hero]:",
+        "            s[j] += pct * count",
+    ]
+    factor = {}
+    for c, cat in enumerate(categories):
+        slots = [j for j, (k, _) in enumerate(op_keys) if k == cat]
+        if not slots:
+            factor[cat] = None  # unused: constant 1.0
+            continue
+        if categories[cat] == "per_op":
+            expr = " * ".join(f"(1.0 + s[{j}])" for j in slots)
+        else:
+            expr = "1.0 + " + " + ".join(f"s[{j}]" for j in slots)
+        lines.append(f"    f{c} = {expr}")
+        factor[cat] = f"f{c}"
+
+    outs, denominators = [], {}
+    for powers in formula["outputs"].values():
+        num, den = [], []
+        for cat, p in powers.items():
+            if factor[cat] is None or p == 0:
+                continue
+            if float(p).is_integer():
+                (num if p > 0 else den).extend([factor[cat]] * abs(int(p)))
+            else:
+                (num if p > 0 else den).append(f"{factor[cat]} ** {abs(float(p))!r}")
+        expr = " * ".join(num) or "1.0"
+        if den:
+            den_expr = " * ".join(den)
+            if den_expr not in denominators:
+                denominators[den_expr] = f"d{len(denominators)}"
+                lines.append(f"    {denominators[den_expr]} = {den_expr}")
+            expr = f"{expr} / ({denominators[den_expr]} or 1.0)"  # guard against a zero denominator
+        outs.append(expr)
+
+    lines.append(f"    return (s, ({', '.join(factor[c] or '1.0' for c in categories)},), "
+                 f"({', '.join(outs)},))")
+    source = "\n".join(lines) + "\n"
+
+    namespace = {"TERMS": terms}
+    exec(compile(source, f"<formula {len(op_keys)} ops>", "exec"), namespace)
+    return FormulaKernel(formula, hero_data, op_keys, source, namespace)
+
+
+def skillmod_calculator(kernel):
+    """
+    calculate_skillmod for a compiled kernel: hero_counts -> the result dict
+    both bots display (SkillMod, damage %, damage taken, components).
+    """
+    score = kernel.raw_score
+    op_keys = kernel.op_keys
+    factor_names = [f"{cat}Factor" for cat in kernel.categories]
+    i_skillmod = kernel.output_index["SkillMod"]
+    i_taken = kernel.output_index["DamageTaken"]
+
+    def calculate_skillmod(hero_counts):
+        sums, factors, outputs = score(hero_counts)
+        skillmod = outputs[i_skillmod]
+        taken = outputs[i_taken]
+        components = dict(zip(factor_names, factors))
+        components["per_op"] = {key: s for key, s in zip(op_keys, sums) if s}
+        return {
+            "SkillMod": skillmod,
+            "Damage%Increase": (skillmod - 1.0) * 100.0,
+            "FinalDamageTakenMultiplier": taken,
+            "DamageTaken%Change": (taken - 1.0) * 100.0,  # negative = less damage taken
+            "components": components,
+        }
+
+    return calculate_skillmod
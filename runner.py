@@ -0,0 +1,32 @@
+# runner.py
+# Runs the `!` text commands (main.py) and the slash commands (bot.py) on one
+# bot: one gateway connection, one event loop, and one copy of the hero
+# table, name index, formula kernel and result caches (ranked indexes,
+# formation table, leaderboards).
+# Needs DISCORD_BOT_TOKEN and the Message Content intent enabled for the bot.
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ["PREFIX_COMMANDS"] = "1"  # bot.py requests Message Content
+
+import bot as slash  # noqa: E402
+from main import TextCommands  # noqa: E402
+
+
+async def setup_hook():
+    # Text commands score with bot.py's engine, not main.py's copy.
+    await slash.bot.add_cog(TextCommands(slash.HERO_DATA, slash.HERO_NAME_INDEX,
+                                         slash.calculate_skillmod))
+
+
+slash.bot.setup_hook = setup_hook
+
+if __name__ == "__main__":
+    TOKEN = os.getenv("DISCORD_BOT_TOKEN")
+    if not TOKEN:
+        print("ERROR: set DISCORD_BOT_TOKEN in environment")
+        raise SystemExit(1)
+    slash.bot.run(TOKEN)
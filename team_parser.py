@@ -0,0 +1,142 @@
+# team_parser.py
+# One tokenizer for every team string both bots accept:
+#   "Chenko 4 Amane 2"      (pairs)
+#   "Chenko:4,Amane:2"      (Name:count, comma or space separated)
+#   "Chenko×4 Amane×2"      (Name×count, also Name*count)
+#   "Chenko, Amane"         (bare names count once)
+# Names are normalized case-insensitively through a dict index built once per
+# hero table, and errors carry the position they were found at.
+
+import re
+from collections import Counter
+
+# One match per entry: separators, a hero name, an optional ":"/"×"/"*",
+# and an optional count. Anything else except separators is captured as
+# `bad`, so the only thing the scan can skip is trailing separators
+# ("Chenko:4,").
+_ENTRY_RE = re.compile(r"""
+    [\s,]*
+    (?:
+        (?P<name>[A-Za-z][A-Za-z'’-]*)
+        (?:\s*(?P<sep>[:×*])\s*|[\s,]*)
+        (?P<count>\d*)
+      | (?P<bad>[^\s,])
+    )
+""", re.VERBOSE)
+
+
+class TeamParseError(ValueError):
+    """Malformed team string; `position` is the 0-based offset of the problem."""
+
+    def __init__(self, message, text, position):
+        super().__init__(f"{message} (at position {position + 1})")
+        self.text = text
+        self.position = position
+
+    def pointer(self):
+        """The input with a caret under the offending character."""
+        return f"{self.text}\n{' ' * self.position}^"
+
+
+class UnknownHeroError(KeyError):
+    """Hero name not in the table. args[0] is the name as typed."""
+
+    def __init__(self, name, position):
+        super().__init__(name)
+        self.name = name
+        self.position = position
+
+
+def build_name_index(hero_names):
+    """Map lower-cased hero names to their canonical spelling."""
+    return {h.lower(): h for h in hero_names}
+
+
+def normalize_hero_name(name, name_index):
+    """Canonical hero name, or None if unknown."""
+    return name_index.get(name.strip().lower())
+
+
+def parse_team(text, name_index):
+    """
+    Parse any supported team string into {canonical_name: count} in one pass.
+    Repeated heroes are summed; zero counts are dropped.
+    Raises TeamParseError for bad syntax and UnknownHeroError for unknown names.
+    """
+    if not text:
+        return {}
+
+    hero_counts = _parse_plain_pairs(text, name_index)
+    if hero_counts is not None:
+        return hero_counts
+
+    # General path: findall builds the entry tuples in C; counts are summed per
+    # name as typed, so each distinct spelling is normalized once.
+    raw_counts = {}
+    for name, sep, count, bad in _ENTRY_RE.findall(text):
+        if bad or (sep and not count):
+            _raise_first_error(text)
+        raw_counts[name] = raw_counts.get(name, 0) + (int(count) if count else 1)
+
+    hero_counts = {}
+    for name, count in raw_counts.items():
+        matched = name_index.get(name.lower())
+        if matched is None:
+            raise UnknownHeroError(name, _name_position(text, name))
+        if count:
+            hero_counts[matched] = hero_counts.get(matched, 0) + count
+    return hero_counts
+
+
+_PAIRS_TALLY_MIN = 512  # pairs; below this Counter's setup costs more than it saves
+
+
+def _parse_plain_pairs(text, name_index):
+    # Fast path for "Chenko 4 Amane 2" (what !skillmod's arguments join to):
+    # one split, one digit check over all counts, one lookup per distinct
+    # name. Long inputs repeat the same few (name, count) pairs, so those are
+    # tallied in C by Counter first. None means "not plain pairs", and the
+    # regex scan takes over, which also produces the errors.
+    tokens = text.split()
+    names, counts = tokens[::2], tokens[1::2]
+    if len(names) != len(counts):
+        return None
+    digits = "".join(counts)
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+    raw_counts = {}
+    if len(names) > _PAIRS_TALLY_MIN:
+        for (name, count), times in Counter(zip(names, counts)).items():
+            raw_counts[name] = raw_counts.get(name, 0) + int(count) * times
+    else:
+        for name, count in zip(names, map(int, counts)):
+            raw_counts[name] = raw_counts.get(name, 0) + count
+
+    hero_counts = {}
+    for name, count in raw_counts.items():
+        matched = name_index.get(name.lower())
+        if matched is None:
+            return None
+        if count:
+            hero_counts[matched] = hero_counts.get(matched, 0) + count
+    return hero_counts
+
+
+def _raise_first_error(text):
+    # Slow path, only taken on bad input: rescan with match objects for positions.
+    for m in _ENTRY_RE.finditer(text):
+        if m.group("bad") is not None:
+            raise TeamParseError(
+                f"Expected a hero name, found '{m.group('bad')}'", text,
+                m.start("bad"))
+        if m.group("sep") and not m.group("count"):
+            raise TeamParseError(
+                f"Expected a count after '{m.group('name')}{m.group('sep')}'",
+                text, m.end())
+
+
+def _name_position(text, name):
+    for m in _ENTRY_RE.finditer(text):
+        if m.group("name") == name:
+            return m.start("name")
+    return 0
@@ -0,0 +1,129 @@
+# tools/bench_formula.py
+# Check the compiled formula kernel against the hand-written calculate_skillmod
+# it replaced, then time both. Run from the repo root:
+#   python tools/bench_formula.py [teams]
+
+import os
+import random
+import sys
+import timeit
+from collections import defaultdict
+from math import exp, log1p, prod
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formula import SKILLMOD_FORMULA, compile_formula, skillmod_calculator  # noqa: E402
+
+HERO_DATA = {
+    "Chenko": [("DamageUp", 101, 0.25)],
+    "Amadeus": [("DamageUp", 101, 0.25)],
+    "Yeonwoo": [("DamageUp", 101, 0.25)],
+    "Amane": [("DamageUp", 102, 0.25)],
+    "Howard": [("DefenseUp", 111, 0.20)],
+    "Quinn": [("DefenseUp", 111, 0.20)],
+    "Gordon": [("DefenseUp", 113, 0.25)],
+    "Fahd": [("OppDamageDown", 201, 0.20)],
+    "Saul": [("DefenseUp", 112, 0.10), ("DefenseUp", 113, 0.15)],
+    "Hilde": [("DefenseUp", 112, 0.10), ("DamageUp", 102, 0.15)],
+    "Eric": [("OppDamageDown", 202, 0.20)],
+    "Margot": [("DamageUp", 102, 0.25)],
+}
+
+
+# ---- previous implementation, kept verbatim (bot.py) as the baseline ----
+
+def legacy_compute_factors_from_hero_counts(hero_counts):
+    per_op = defaultdict(float)
+
+    for hero, count in hero_counts.items():
+        if hero not in HERO_DATA:
+            raise KeyError(hero)
+        for (cat, op, pct) in HERO_DATA[hero]:
+            per_op[(cat, op)] += pct * count
+
+    def category_factor(cat_name):
+        factors = []
+        for (cat, op), total_pct in per_op.items():
+            if cat == cat_name:
+                factors.append(1.0 + total_pct)
+        return prod(factors) if factors else 1.0
+
+    return {
+        "per_op": per_op,
+        "DamageUpFactor": category_factor("DamageUp"),
+        "DefenseUpFactor": category_factor("DefenseUp"),
+        "OppDefenseDownFactor": category_factor("OppDefenseDown"),
+        "OppDamageDownFactor": category_factor("OppDamageDown"),
+    }
+
+
+def legacy_calculate_skillmod(hero_counts):
+    groups = legacy_compute_factors_from_hero_counts(hero_counts)
+    dmg_f = groups["DamageUpFactor"]
+    def_f = groups["DefenseUpFactor"]
+    opp_def_f = groups["OppDefenseDownFactor"]
+    opp_dmg_f = groups["OppDamageDownFactor"]
+    denom = opp_dmg_f * def_f if (opp_dmg_f * def_f) != 0 else 1.0
+    skillmod = (dmg_f * opp_def_f) / denom
+    enemy_reduction_factor = 1.0 / opp_dmg_f if opp_dmg_f != 0 else 1.0
+    final_damage_taken_multiplier = (1.0 / def_f) * enemy_reduction_factor
+    return {
+        "SkillMod": skillmod,
+        "Damage%Increase": (skillmod - 1.0) * 100.0,
+        "FinalDamageTakenMultiplier": final_damage_taken_multiplier,
+        "DamageTaken%Change": (final_damage_taken_multiplier - 1.0) * 100.0,
+        "components": groups,
+    }
+
+
+# ---- inputs ----
+
+def make_teams(n, seed=0):
+    rng = random.Random(seed)
+    teams = []
+    for _ in range(n):
+        team = {}
+        for h in rng.choices(list(HERO_DATA), k=rng.randint(1, 6)):
+            team[h] = team.get(h, 0) + 1
+        teams.append(team)
+    return teams
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    teams = make_teams(n)
+    kernel = compile_formula(SKILLMOD_FORMULA, HERO_DATA)
+    calculate = skillmod_calculator(kernel)
+    print("generated kernel:\n" + kernel.source)
+
+    worst = 0.0
+    for team in teams:
+        want, got = legacy_calculate_skillmod(team), calculate(team)
+        for key in ("SkillMod", "FinalDamageTakenMultiplier"):
+            worst = max(worst, abs(want[key] - got[key]) / abs(want[key]))
+        assert dict(want["components"]["per_op"]) == got["components"]["per_op"], team
+    print(f"{n} teams match (max relative difference {worst:.1e})")
+
+    # The scalar kernel and the log-space weights the numpy paths use must agree
+    # on every output, including fractional powers.
+    formula = {**SKILLMOD_FORMULA, "outputs": {**SKILLMOD_FORMULA["outputs"],
+                                               "Fractional": {"DamageUp": 0.5, "DefenseUp": -1.5}}}
+    fractional = compile_formula(formula, HERO_DATA)
+    for team in teams:
+        sums, _, outputs = fractional.score(team)
+        for name, value in outputs.items():
+            weights = fractional.log_weights(name)
+            log_value = sum(weights.get(cat, 0.0) * log1p(s)
+                            for (cat, _), s in zip(fractional.op_keys, sums))
+            assert abs(exp(log_value) - value) <= 1e-12 * value, (name, team)
+    print(f"kernel outputs match log_weights for {len(formula['outputs'])} outputs")
+
+    for label, fn in (("legacy calculate_skillmod", legacy_calculate_skillmod),
+                      ("compiled calculate_skillmod", calculate),
+                      ("compiled kernel only (no result dict)", kernel.raw_score)):
+        best = min(timeit.repeat(lambda: [fn(t) for t in teams], number=10, repeat=5)) / 10 / n
+        print(f"  {label:<40} {best * 1e6:6.2f} µs/team")
+
+
+if __name__ == "__main__":
+    main()
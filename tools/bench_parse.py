@@ -0,0 +1,125 @@
+# tools/bench_parse.py
+# Benchmark team_parser.parse_team against the three parsers it replaced.
+# Run from the repo root:  python tools/bench_parse.py [entries]
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from team_parser import build_name_index, parse_team  # noqa: E402
+
+HERO_NAMES = ["Chenko", "Amadeus", "Yeonwoo", "Amane", "Howard", "Quinn",
+              "Gordon", "Fahd", "Saul", "Hilde", "Eric", "Margot"]
+NAME_INDEX = build_name_index(HERO_NAMES)
+
+
+# ---- previous parsers, kept verbatim (minus Discord I/O) as baselines ----
+
+def legacy_main_skillmod(args):
+    hero_counts = {}
+    if len(args) == 1 and (":" in args[0] or "," in args[0]):
+        part = args[0]
+        items = [p.strip() for p in part.replace(",", " ").split() if p.strip()]
+        for it in items:
+            if ":" in it:
+                name, cnt = it.split(":", 1)
+                hero_counts[name.strip()] = hero_counts.get(name.strip(), 0) + int(cnt)
+            else:
+                hero_counts[it] = hero_counts.get(it, 0) + 1
+    else:
+        if len(args) % 2 != 0:
+            raise ValueError("Arguments must be pairs: hero count")
+        for i in range(0, len(args), 2):
+            name = args[i]
+            cnt = int(args[i + 1])
+            hero_counts[name] = hero_counts.get(name, 0) + cnt
+    normalized = {}
+    for name, cnt in hero_counts.items():
+        matched = None
+        for h in HERO_NAMES:
+            if h.lower() == name.lower():
+                matched = h
+                break
+        if not matched:
+            raise KeyError(name)
+        normalized[matched] = normalized.get(matched, 0) + cnt
+    return normalized
+
+
+def legacy_parse_compact_string(s):
+    if not s:
+        return {}
+    parts = []
+    if "," in s:
+        parts = [p.strip() for p in s.split(",") if p.strip()]
+    else:
+        parts = s.split()
+    hero_counts = {}
+    for it in parts:
+        if ":" in it:
+            name, cnt = it.split(":", 1)
+            name = name.strip()
+            cnt = int(cnt.strip())
+        else:
+            raise ValueError("Use format: Chenko:4,Amane:2")
+        matched = None
+        for h in HERO_NAMES:
+            if h.lower() == name.lower():
+                matched = h
+                break
+        if not matched:
+            raise KeyError(name)
+        hero_counts[matched] = hero_counts.get(matched, 0) + cnt
+    return hero_counts
+
+
+def legacy_parse_roster_string(roster_str):
+    heroes = {}
+    for p in roster_str.split(","):
+        if not p.strip():
+            continue
+        name, count = p.split(":")
+        heroes[name.strip()] = int(count.strip())
+    return heroes
+
+
+# ---- inputs ----
+
+def make_inputs(entries, seed=0):
+    rng = random.Random(seed)
+    picks = [(rng.choice(HERO_NAMES), rng.randint(1, 6)) for _ in range(entries)]
+    compact = ",".join(f"{h.lower() if rng.random() < 0.3 else h}:{c}" for h, c in picks)
+    pairs = [tok for h, c in picks for tok in (h, str(c))]
+    return compact, pairs
+
+
+def bench(label, fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<38} {best * 1e6:10.1f} µs/call")
+    return best
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [4, 100, 10_000]
+    for entries in sizes:
+        compact, pairs = make_inputs(entries)
+        spaced = " ".join(pairs)
+        number = max(1, 200_000 // entries)
+        assert parse_team(compact, NAME_INDEX) == legacy_parse_compact_string(compact)
+        assert parse_team(spaced, NAME_INDEX) == legacy_main_skillmod(pairs)
+        print(f"{entries} entries ({len(compact)} chars):")
+        base = bench("legacy parse_compact_string", lambda: legacy_parse_compact_string(compact), number)
+        bench("legacy parse_roster_string (no names)", lambda: legacy_parse_roster_string(compact), number)
+        base_pairs = bench("legacy !skillmod pairs (incl. split)",
+                           lambda: legacy_main_skillmod(spaced.split()), number)
+        new = bench("parse_team  Name:count", lambda: parse_team(compact, NAME_INDEX), number)
+        new_pairs = bench("parse_team  pairs", lambda: parse_team(spaced, NAME_INDEX), number)
+        print(f"  speedup vs parse_compact_string: {base / new:.2f}×, "
+              f"vs !skillmod pairs: {base_pairs / new_pairs:.2f}×\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# tools/bench_runner.py
+# Memory and per-command latency of the two deployments:
+#   separate: main.py (`!` commands) and bot.py (`/` commands) as two processes
+#   combined: runner.py hosting both on one bot
+# Each configuration runs in a fresh subprocess that imports the bot(s), loads
+# the commands, replays the same !skillmod / /skillmod calls through the
+# handlers (fake context/interaction, no Discord connection) and reports its
+# peak RSS. Gateway caches are not included, so real savings are larger.
+#
+#   python tools/bench_runner.py
+#   python tools/bench_runner.py --calls 5000
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from statistics import median
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(HERE)
+
+
+class FakeContext:
+    """Just enough of commands.Context for main.py's handlers."""
+
+    def __init__(self):
+        self.sent = None
+
+    async def send(self, content=None, **kwargs):
+        self.sent = content
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024.0
+    return float("nan")
+
+
+def make_teams(calls, heroes, seed=0):
+    rng = random.Random(seed)
+    return [{h: rng.randint(1, 3) for h in rng.sample(heroes, rng.randint(1, 4))}
+            for _ in range(calls)]
+
+
+async def time_text(bot, teams):
+    cog, cmd = bot.get_cog("TextCommands"), bot.get_command("skillmod")
+    lat = []
+    for team in teams:
+        args = [tok for h, c in team.items() for tok in (h, str(c))]
+        ctx = FakeContext()
+        t = time.perf_counter()
+        await cmd.callback(cog, ctx, *args)
+        lat.append(time.perf_counter() - t)
+    return lat
+
+
+async def time_slash(bot_module, teams):
+    from replay import FakeInteraction
+    lat = []
+    for team in teams:
+        options = {}
+        for slot, (h, c) in enumerate(team.items(), 1):
+            options[f"hero{slot}"], options[f"count{slot}"] = h, c
+        inter = FakeInteraction({"command": "skillmod", "user": "00000000000a",
+                                 "guild": "00000000000b", "options": options})
+        t = time.perf_counter()
+        await bot_module.slash_skillmod.callback(inter, **options)
+        lat.append(time.perf_counter() - t)
+    return lat
+
+
+def run_config(config, calls):
+    """Runs inside the subprocess; returns {"rss_mb", "<command>": [latencies]}."""
+    os.environ.setdefault("GUILD_IDS", "1")
+    os.environ.pop("DISCORD_BOT_TOKEN", None)
+    sys.path[:0] = [REPO_ROOT, HERE]
+    out = {}
+
+    async def go():
+        if config == "main":
+            import main
+            text_bot = main.make_bot()
+            await text_bot.setup_hook()
+            out["!skillmod"] = await time_text(text_bot, make_teams(calls, list(main.HERO_DATA)))
+        elif config == "bot":
+            import bot
+            out["/skillmod"] = await time_slash(bot, make_teams(calls, list(bot.HERO_DATA)))
+        else:
+            import runner
+            await runner.slash.bot.setup_hook()
+            teams = make_teams(calls, list(runner.slash.HERO_DATA))
+            out["!skillmod"] = await time_text(runner.slash.bot, teams)
+            out["/skillmod"] = await time_slash(runner.slash, teams)
+
+    asyncio.run(go())
+    out["rss_mb"] = rss_mb()
+    return out
+
+
+def spawn(config, calls):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", config, "--calls", str(calls)]
+    res = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=REPO_ROOT)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def describe(lat):
+    ms = sorted(x * 1000 for x in lat)
+    return f"p50 {median(ms):7.3f} ms  p99 {ms[min(len(ms) - 1, int(0.99 * len(ms)))]:7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--child", choices=["main", "bot", "combined"])
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(args.child, args.calls)))
+        return
+
+    text, slash, both = (spawn(c, args.calls) for c in ("main", "bot", "combined"))
+    print(f"separate: main.py {text['rss_mb']:.1f} MB + bot.py {slash['rss_mb']:.1f} MB "
+          f"= {text['rss_mb'] + slash['rss_mb']:.1f} MB peak RSS")
+    print(f"combined: runner.py {both['rss_mb']:.1f} MB peak RSS\n")
+    print(f"  !skillmod  separate {describe(text['!skillmod'])}   combined {describe(both['!skillmod'])}")
+    print(f"  /skillmod  separate {describe(slash['/skillmod'])}   combined {describe(both['/skillmod'])}")
+
+
+if __name__ == "__main__":
+    main()
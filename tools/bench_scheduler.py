@@ -0,0 +1,126 @@
+# tools/bench_scheduler.py
+# Flood the bot with heavy /recommend searches (distinct rosters, so every one
+# is a cache miss) from several users and guilds while a steady stream of cheap
+# /skillmod and /hero calls is measured. Runs once with admission control
+# effectively off ("unlimited") and once with bot.py's defaults.
+#
+#   python tools/bench_scheduler.py
+#   python tools/bench_scheduler.py --heavy 40 --users 8 --guilds 3 --slots 7
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from statistics import median
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+os.environ.setdefault("GUILD_IDS", "1")
+
+import bot  # noqa: E402
+from replay import FakeInteraction  # noqa: E402
+
+
+def entry(command, user, guild, **options):
+    return {"kind": "command", "command": command, "user": f"{user:012x}",
+            "guild": f"{guild:012x}", "options": options}
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else float("nan")
+
+
+async def flood(args, rng):
+    bot._ranked_index.clear()
+    heroes = list(bot.HERO_DATA)
+    cheap = {"skillmod": [], "hero": []}
+    heavy = {"ok": [], "busy": 0}
+
+    async def run_heavy(i):
+        user, guild = 1 + i % args.users, 1 + i % args.guilds
+        roster = ",".join(f"{h}:{rng.randint(2, args.slots)}" for h in heroes)
+        inter = FakeInteraction(entry("recommend", user, guild, heroes=roster, slots=args.slots))
+        inter.started = time.perf_counter()
+        await bot.recommend.callback(inter, heroes=roster, slots=args.slots)
+        if isinstance(inter.output, str):  # rejected by admission control
+            heavy["busy"] += 1
+        else:
+            heavy["ok"].append(inter.finished - inter.started)
+
+    async def run_cheap(i):
+        if i % 2:
+            inter = FakeInteraction(entry("hero", 999, 1, name=rng.choice(heroes)))
+            inter.started = time.perf_counter()
+            await bot.slash_hero.callback(inter, name=inter.namespace.name)
+            cheap["hero"].append(inter.finished - inter.started)
+        else:
+            options = {}
+            for slot, hero in enumerate(rng.sample(heroes, 3), 1):
+                options[f"hero{slot}"], options[f"count{slot}"] = hero, rng.randint(1, 3)
+            inter = FakeInteraction(entry("skillmod", 999, 1, **options))
+            inter.started = time.perf_counter()
+            await bot.slash_skillmod.callback(inter, **options)
+            cheap["skillmod"].append(inter.finished - inter.started)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(args.heavy):
+        tasks.append(asyncio.create_task(run_heavy(i)))
+        await asyncio.sleep(args.heavy_gap / 1000.0)
+    i = 0
+    while any(not t.done() for t in tasks) or i < args.cheap:
+        tasks.append(asyncio.create_task(run_cheap(i)))
+        i += 1
+        await asyncio.sleep(args.cheap_gap / 1000.0)
+    await asyncio.gather(*tasks)
+    return cheap, heavy, time.perf_counter() - start
+
+
+def report(label, cheap, heavy, wall):
+    print(f"\n{label}  (wall {wall:.1f}s)")
+    for name, lat in cheap.items():
+        ms = [x * 1000 for x in lat]
+        print(f"  /{name:<9} n={len(ms):<5} p50={median(ms):8.2f} ms  p99={pct(ms, 0.99):8.2f} ms"
+              f"  max={max(ms):8.2f} ms")
+    ms = [x * 1000 for x in heavy["ok"]]
+    if ms:
+        print(f"  /recommend n={len(ms):<5} p50={median(ms):8.1f} ms  p99={pct(ms, 0.99):8.1f} ms"
+              f"  rejected={heavy['busy']}")
+    else:
+        print(f"  /recommend n=0 rejected={heavy['busy']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heavy", type=int, default=24, help="heavy /recommend jobs to flood")
+    parser.add_argument("--heavy-gap", type=float, default=5.0, help="ms between heavy arrivals")
+    parser.add_argument("--cheap", type=int, default=200, help="minimum cheap calls")
+    parser.add_argument("--cheap-gap", type=float, default=10.0, help="ms between cheap calls")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    unlimited = 10 ** 6
+    configs = [
+        ("unlimited (no admission control)",
+         bot.AdmissionScheduler(max_running=os.cpu_count() + 4, max_queued=unlimited,
+                                per_user=unlimited, per_guild=unlimited)),
+        (f"admission control (running={bot.HEAVY_MAX_RUNNING}, queued={bot.HEAVY_MAX_QUEUED}, "
+         f"per user={bot.HEAVY_PER_USER}, per guild={bot.HEAVY_PER_GUILD})",
+         bot.AdmissionScheduler()),
+    ]
+    for label, scheduler in configs:
+        bot.heavy_jobs = scheduler
+        cheap, heavy, wall = asyncio.run(flood(args, random.Random(args.seed)))
+        report(label, cheap, heavy, wall)
+        scheduler.executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# tools/bench_search.py
+# Scaling benchmark for bot.search_top_formations: the same roster searched
+# with 1..N worker processes. Checks every run returns exactly the sequential
+# top-K before reporting its time.
+#
+#   python tools/bench_search.py                      # 30 synthetic heroes, 6 slots, up to cpu_count workers
+#   python tools/bench_search.py --heroes 40 --slots 6 --workers 1 2 4 8
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GUILD_IDS", "1")
+
+import bot  # noqa: E402
+
+
+def synthetic_table(heroes, seed=0):
+    """Hero table shaped like HERO_DATA: mostly single effects, some two-effect heroes."""
+    rng = random.Random(seed)
+    cats = [("DamageUp", range(101, 105)), ("DefenseUp", range(111, 115)),
+            ("OppDamageDown", range(201, 204))]
+    table = dict(bot.HERO_DATA)
+    for i in range(heroes - len(table)):
+        effects = []
+        for _ in range(1 if rng.random() < 0.8 else 2):
+            cat, ops = rng.choice(cats)
+            effects.append((cat, rng.choice(ops), rng.choice([0.10, 0.15, 0.20, 0.25])))
+        table[f"Hero{i:03d}"] = effects
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=30)
+    parser.add_argument("--slots", type=int, default=6)
+    parser.add_argument("--limit", type=int, default=6, help="copies of each hero in the roster")
+    parser.add_argument("--top", type=int, default=bot.SEARCH_TOP_K)
+    parser.add_argument("--workers", type=int, nargs="*")
+    args = parser.parse_args()
+
+    table = synthetic_table(args.heroes)
+    roster = {h: args.limit for h in table}
+    total = bot.count_formations([min(args.limit, args.slots)] * len(roster), args.slots)
+    workers = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"{len(roster)} heroes × {args.limit}, {args.slots} slots: {total:,} formations, "
+          f"top-{args.top}, {os.cpu_count()} CPUs\n")
+
+    reference = None
+    base = None
+    for w in workers:
+        start = time.perf_counter()
+        result = bot.search_top_formations(roster, args.slots, args.top, workers=w,
+                                           hero_table=table)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, base = result, elapsed
+        status = "identical" if result == reference else "MISMATCH"
+        print(f"  workers={w:<3} {elapsed:8.2f} s   speedup {base / elapsed:5.2f}×   "
+              f"{total / elapsed / 1e6:6.2f} M formations/s   {status}")
+        if result != reference:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
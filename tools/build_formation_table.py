@@ -0,0 +1,87 @@
+# tools/build_formation_table.py
+# Offline build of the memory-mapped formation table bot.py maps at startup
+# (FORMATION_TABLE, default ./formation_table). Re-run whenever HERO_DATA
+# changes; the bot ignores a table built from other hero data.
+#
+#   python tools/build_formation_table.py                  # 6 slots into ./formation_table
+#   python tools/build_formation_table.py --slots 8 --out /srv/skillmod/formation_table
+#   python tools/build_formation_table.py --check          # verify + time lookups only
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GUILD_IDS", "1")
+
+import bot  # noqa: E402
+
+
+def check(table, samples, seed=0):
+    """Compare random table lookups with calculate_skillmod and time both."""
+    rng = random.Random(seed)
+    heroes = list(bot.HERO_DATA)
+    teams = []
+    for _ in range(samples):
+        size = rng.randint(1, table.slots)
+        team = {}
+        for h in rng.choices(heroes, k=size):
+            team[h] = team.get(h, 0) + 1
+        teams.append(team)
+
+    for team in teams:
+        want, got = bot.calculate_skillmod(team), table.lookup(team)
+        for key in ("SkillMod", "Damage%Increase", "DamageTaken%Change"):
+            if abs(want[key] - got[key]) > 1e-9:
+                sys.exit(f"mismatch for {team}: {key} {got[key]} != {want[key]}")
+
+    t = time.perf_counter()
+    for team in teams:
+        bot.calculate_skillmod(team)
+    direct = time.perf_counter() - t
+    t = time.perf_counter()
+    for team in teams:
+        table.lookup(team)
+    mapped = time.perf_counter() - t
+    print(f"{samples} random teams match; calculate_skillmod {direct / samples * 1e6:.1f} µs, "
+          f"table lookup {mapped / samples * 1e6:.1f} µs per team")
+
+    for size in range(1, table.slots + 1):
+        ranked = table.ranked(size)
+        t = time.perf_counter()
+        top = ranked.page("attack", 0, 5)
+        fast = time.perf_counter() - t
+        t = time.perf_counter()
+        full = bot.build_ranked_formations({h: size for h in heroes}, max_size=size)
+        slow = time.perf_counter() - t
+        if [s["damage_pct"] for s in top] != [s["damage_pct"] for s in full.page("attack", 0, 5)]:
+            sys.exit(f"top-5 attack mismatch at size {size}")
+        print(f"size {size}: {len(ranked):>7} formations, top-5 slice {fast * 1e3:.3f} ms "
+              f"vs full rebuild {slow * 1e3:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=bot.FORMATION_TABLE_DIR)
+    parser.add_argument("--slots", type=int, default=bot.FORMATION_TABLE_SLOTS)
+    parser.add_argument("--check", action="store_true", help="don't build, only verify the existing table")
+    parser.add_argument("--samples", type=int, default=20000)
+    args = parser.parse_args()
+
+    if not args.check:
+        t = time.perf_counter()
+        rows = bot.write_formation_table(args.out, args.slots)
+        size = sum(os.path.getsize(os.path.join(args.out, f)) for f in os.listdir(args.out))
+        print(f"wrote {rows} formations ({size / 1024:.0f} KiB) to {args.out} "
+              f"in {time.perf_counter() - t:.1f}s")
+
+    table = bot.FormationTable.load(args.out)
+    if table is None:
+        sys.exit(f"no usable table at {args.out}")
+    check(table, args.samples)
+
+
+if __name__ == "__main__":
+    main()
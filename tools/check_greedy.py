@@ -0,0 +1,95 @@
+# tools/check_greedy.py
+# Validate bot.optimize_formation against exhaustive ranking
+# (build_ranked_formations) on every small roster: all hero subsets up to
+# --heroes distinct heroes with counts 1..--max-count, formations of
+# 1..--slots heroes, both objectives. Also compares the greedy against
+# exhaustive search on the full roster, and checks that get_ranked_formations
+# serves rank 1 from the optimizer past SEARCH_MAX_FORMATIONS.
+#
+#   python tools/check_greedy.py
+#   python tools/check_greedy.py --heroes 4 --max-count 2 --slots 5
+
+import argparse
+import os
+import sys
+import time
+from itertools import combinations, product
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GUILD_IDS", "1")
+
+import bot  # noqa: E402
+
+
+def check(roster, slots, stats):
+    ranked = bot.build_ranked_formations(roster, max_size=slots)
+    for objective in ("attack", "garrison"):
+        found, method = bot.optimize_formation(roster, objective, slots)
+        stats[method] += 1
+        expected = ranked.page(objective, 0, 1)
+        if not expected:
+            if found is not None:
+                return f"{roster} {slots} {objective}: expected no formation, got {found}"
+            continue
+        key = "damage_pct" if objective == "attack" else "taken_pct"
+        if found is None or abs(found[key] - expected[0][key]) > 1e-9:
+            return (f"{roster} slots={slots} {objective}: optimizer {found} "
+                    f"vs exhaustive {expected[0]}")
+        if sum(found["heroes"].values()) != slots or any(
+                c > roster[h] for h, c in found["heroes"].items()):
+            return f"{roster} slots={slots} {objective}: invalid formation {found}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heroes", type=int, default=3, help="max distinct heroes per roster")
+    parser.add_argument("--max-count", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=4)
+    args = parser.parse_args()
+
+    names = list(bot.HERO_DATA)
+    stats = {"greedy": 0, "exact": 0}
+    cases = 0
+    start = time.perf_counter()
+    for size in range(1, args.heroes + 1):
+        for subset in combinations(names, size):
+            for counts in product(range(1, args.max_count + 1), repeat=size):
+                roster = dict(zip(subset, counts))
+                for slots in range(1, args.slots + 1):
+                    error = check(roster, slots, stats)
+                    cases += 1
+                    if error:
+                        print("FAIL", error)
+                        sys.exit(1)
+    for slots in range(1, 7):
+        error = check({h: 6 for h in names}, slots, stats)
+        cases += 1
+        if error:
+            print("FAIL", error)
+            sys.exit(1)
+
+    # Force the optimizer tier (the 12-hero roster never gets that large).
+    saved = bot.FULL_INDEX_MAX_FORMATIONS, bot.SEARCH_MAX_FORMATIONS
+    bot.FULL_INDEX_MAX_FORMATIONS = bot.SEARCH_MAX_FORMATIONS = 0
+    try:
+        for slots in range(1, 7):
+            roster = {h: 5 for h in names}
+            bot._ranked_index.clear()
+            served = bot.get_ranked_formations(roster, max_size=slots)
+            full = bot.build_ranked_formations(roster, max_size=slots)
+            for objective, key in (("attack", "damage_pct"), ("garrison", "taken_pct")):
+                got, want = served.page(objective, 0, 5), full.page(objective, 0, 1)
+                if len(got) != 1 or abs(got[0][key] - want[0][key]) > 1e-9:
+                    print(f"FAIL get_ranked_formations slots={slots} {objective}: {got} vs {want}")
+                    sys.exit(1)
+    finally:
+        bot.FULL_INDEX_MAX_FORMATIONS, bot.SEARCH_MAX_FORMATIONS = saved
+        bot._ranked_index.clear()
+
+    print(f"OK: {cases} roster/slot cases, both objectives, in {time.perf_counter() - start:.1f} s "
+          f"({stats['greedy']} answered by greedy, {stats['exact']} by exact fallback)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# tools/check_parse.py
+# Regression table for team_parser.parse_team: every format the bots accept
+# (the legacy parsers' inputs included) and the errors bad input must raise.
+# Run from the repo root:  python tools/check_parse.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from team_parser import TeamParseError, UnknownHeroError, build_name_index, parse_team  # noqa: E402
+
+NAME_INDEX = build_name_index(["Chenko", "Amane", "Saul", "Hilde", "Gordon", "Fahd"])
+
+# (input, expected {hero: count})
+ACCEPTED = [
+    ("", {}),
+    ("Chenko 4 Amane 2", {"Chenko": 4, "Amane": 2}),                 # !skillmod pairs
+    ("Chenko:4,Amane:2", {"Chenko": 4, "Amane": 2}),                 # compact
+    ("Chenko:4 Amane:2", {"Chenko": 4, "Amane": 2}),
+    ("Chenko : 4 , Amane: 2", {"Chenko": 4, "Amane": 2}),
+    ("Chenko×4 Amane×2", {"Chenko": 4, "Amane": 2}),
+    ("Chenko*4,Amane*2", {"Chenko": 4, "Amane": 2}),
+    ("Chenko4", {"Chenko": 4}),
+    ("Chenko, Amane", {"Chenko": 1, "Amane": 1}),                    # bare names
+    ("Chenko Amane:3 Saul", {"Chenko": 1, "Amane": 3, "Saul": 1}),
+    ("chenko:1 CHENKO 2", {"Chenko": 3}),                            # case, repeats summed
+    ("Chenko:0,Amane", {"Amane": 1}),                                # zero counts dropped
+    ("Chenko:4,", {"Chenko": 4}),                                    # trailing separators
+    ("Chenko:4, ,", {"Chenko": 4}),
+    (", Chenko", {"Chenko": 1}),
+    ("Gordon:2,Saul:2,Fahd:1,Hilde:1", {"Gordon": 2, "Saul": 2, "Fahd": 1, "Hilde": 1}),
+]
+
+# (input, exception type, position of the problem, unknown name or None)
+REJECTED = [
+    ("Chenko:,Amane", TeamParseError, 7, None),      # separator without a count
+    ("Chenko:-1", TeamParseError, 7, None),
+    ("Chenko:4;Amane", TeamParseError, 8, None),     # unknown separator
+    ("4 Chenko", TeamParseError, 0, None),           # count before any name
+    ("Chenko 2 3", TeamParseError, 9, None),         # dangling count
+    ("Chenko:4,Bob:2", UnknownHeroError, 9, "Bob"),
+    ("Bob", UnknownHeroError, 0, "Bob"),
+]
+
+
+def main():
+    failures = []
+    for text, want in ACCEPTED:
+        try:
+            got = parse_team(text, NAME_INDEX)
+        except (TeamParseError, UnknownHeroError) as e:
+            failures.append(f"{text!r}: expected {want}, raised {e!r}")
+            continue
+        if got != want:
+            failures.append(f"{text!r}: expected {want}, got {got}")
+
+    for text, error, position, name in REJECTED:
+        try:
+            got = parse_team(text, NAME_INDEX)
+        except error as e:
+            if e.position != position or (name is not None and e.name != name):
+                failures.append(f"{text!r}: {error.__name__} at {e.position} "
+                                f"(name {getattr(e, 'name', None)!r}), expected {position}"
+                                f"{f' (name {name!r})' if name else ''}")
+        except (TeamParseError, UnknownHeroError) as e:
+            failures.append(f"{text!r}: expected {error.__name__}, raised {e!r}")
+        else:
+            failures.append(f"{text!r}: expected {error.__name__}, got {got}")
+
+    for line in failures:
+        print("FAIL", line)
+    if failures:
+        sys.exit(1)
+    print(f"OK: {len(ACCEPTED)} accepted and {len(REJECTED)} rejected inputs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# tools/check_scheduler.py
+# Replay fixed arrival patterns through bot.AdmissionScheduler with one
+# running slot and check the order jobs start in: a guild that just had a job
+# started goes behind every other waiting guild, and guilds that keep going
+# idle and coming back cannot starve one that is waiting. Also checks the
+# scheduler's bookkeeping is empty afterwards.
+#
+#   python tools/check_scheduler.py
+
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GUILD_IDS", "1")
+
+import bot  # noqa: E402
+
+# Steps: "<guild><n>" = job n arrives from guild <guild> (each job its own
+# user); "done" = the running job finishes. Leftover jobs are drained at the end.
+CASES = [
+    ("queued guild goes behind a newcomer",
+     ["A1", "A2", "A3", "B4"],
+     ["A1", "B4", "A2", "A3"]),
+    ("three guilds interleaved",
+     ["A1", "A2", "B1", "A3", "C1", "B2"],
+     ["A1", "B1", "C1", "A2", "B2", "A3"]),
+    ("guilds taking turns going idle do not starve a waiting one",
+     ["A1", "A2", "B1", "done", "C2", "done", "B3", "done", "C4", "done", "B5", "done", "C6"],
+     ["A1", "B1", "A2", "C2", "B3", "C4", "B5", "C6"]),
+]
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0.005)
+
+
+async def replay(steps):
+    scheduler = bot.AdmissionScheduler(max_running=1, max_queued=64, per_user=1, per_guild=1)
+    started, gates, tasks = [], {}, []
+
+    def job(name):
+        def run():
+            started.append(name)
+            gates[name].wait()
+        return run
+
+    async def finish_running():
+        running = [n for n in started if not gates[n].is_set()]
+        if running:
+            gates[running[0]].set()
+        await settle()
+
+    for user, step in enumerate(steps):
+        if step == "done":
+            await finish_running()
+            continue
+        gates[step] = threading.Event()
+        tasks.append(asyncio.create_task(scheduler.run(user, step[0], job(step))))
+        await settle()
+    while not all(t.done() for t in tasks):
+        await finish_running()
+    await asyncio.gather(*tasks)
+    scheduler.executor.shutdown(wait=True)
+
+    leftovers = {name: value for name, value in (
+        ("user_jobs", dict(scheduler.user_jobs)), ("guild_running", dict(scheduler.guild_running)),
+        ("waiting", dict(scheduler.waiting)), ("served", scheduler.served),
+        ("queued", scheduler.queued), ("running", scheduler.running)) if value}
+    return started, leftovers
+
+
+def main():
+    failed = False
+    for label, steps, expected in CASES:
+        started, leftovers = asyncio.run(replay(steps))
+        ok = started == expected and not leftovers
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}: {started}"
+              + ("" if started == expected else f" (expected {expected})")
+              + (f" leftover state {leftovers}" if leftovers else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+# tools/replay.py
+# Replay a recorded interaction trace (TRACE_FILE=... in bot.py) through the
+# slash-command handlers against a fake interaction layer, and compare handler
+# latency between two versions of the code.
+#
+#   python tools/replay.py compare traces/prod.jsonl --baseline HEAD~1
+#   python tools/replay.py compare traces/prod.jsonl --baseline v1.2 --candidate . --speed 10
+#   python tools/replay.py run . traces/prod.jsonl --rtt 60
+#
+# `compare` checks each version out into a temp dir (the working tree for ".")
+# and replays it in its own subprocess, so the two versions never share
+# imported modules or caches. --speed 1 keeps the recorded spacing, --speed 10
+# plays it ten times faster, --speed 0 sends everything back-to-back. --rtt adds
+# a simulated Discord round trip to every response call.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ---------------------------
+# Fake interaction layer
+# ---------------------------
+
+class FakeUser:
+    def __init__(self, anon_id):
+        self.id = int(anon_id[:12], 16) if anon_id else 0
+        self.display_name = f"user-{(anon_id or '0')[:6]}"
+        self.name = self.display_name
+        self.mention = f"<@{self.id}>"
+
+
+class FakeNamespace:
+    """Mimics app_commands.Namespace: missing options read as None."""
+
+    def __init__(self, options):
+        self.__dict__.update(options)
+
+    def __getattr__(self, name):
+        return None
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _round_trip(self):
+        if self._interaction.rtt:
+            await asyncio.sleep(self._interaction.rtt)
+        self._interaction.calls += 1
+
+    async def defer(self, *, ephemeral=False, thinking=False):
+        self._done = True
+        await self._round_trip()
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        await self._round_trip()
+        self._interaction.finish(content, kwargs)
+
+    async def edit_message(self, content=None, **kwargs):
+        self._done = True
+        await self._round_trip()
+        self._interaction.finish(content, kwargs)
+
+    async def autocomplete(self, choices):
+        self._done = True
+        await self._round_trip()
+        self._interaction.finish(None, {"choices": choices})
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        if self._interaction.rtt:
+            await asyncio.sleep(self._interaction.rtt)
+        self._interaction.calls += 1
+        self._interaction.finish(content, kwargs)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the bot.py handlers."""
+
+    def __init__(self, entry, rtt=0.0):
+        self.rtt = rtt
+        self.user = FakeUser(entry.get("user"))
+        self.guild_id = int(entry["guild"][:12], 16) if entry.get("guild") else None
+        self.namespace = FakeNamespace(entry.get("options", {}))
+        self.data = {
+            "name": entry["command"],
+            "options": [{"name": k, "value": v, "focused": k == entry.get("focused")}
+                        for k, v in entry.get("options", {}).items()],
+        }
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.calls = 0
+        self.started = None
+        self.finished = None
+        self.output = None
+
+    def finish(self, content, kwargs):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+            self.output = content if content is not None else kwargs
+
+
+# ---------------------------
+# Replay (runs inside one checked-out tree)
+# ---------------------------
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_command(bot_module, name):
+    tree = bot_module.tree
+    for guild in (bot_module.GUILDS or [None]):
+        cmd = tree.get_command(name, guild=guild)
+        if cmd is not None:
+            return cmd
+    return None
+
+
+async def dispatch(bot_module, entry, rtt):
+    """Run one trace entry; returns (latency_seconds, round_trips) or None if skipped."""
+    cmd = find_command(bot_module, entry["command"])
+    if cmd is None:
+        return None
+    interaction = FakeInteraction(entry, rtt)
+    interaction.started = time.perf_counter()
+    options = entry.get("options", {})
+
+    if entry["kind"] == "autocomplete":
+        param = cmd._params.get(entry.get("focused"))
+        if param is None or not callable(param.autocomplete):
+            return None
+        choices = await param.autocomplete(interaction, options.get(entry["focused"], ""))
+        await interaction.response.autocomplete(choices)
+    else:
+        known = {k: v for k, v in options.items() if k in cmd._params}
+        await cmd.callback(interaction, **known)
+
+    end = interaction.finished or time.perf_counter()
+    return end - interaction.started, interaction.calls
+
+
+async def replay(bot_module, trace, speed, rtt):
+    results = []
+    t0 = trace[0]["ts"] if trace else 0.0
+    start = time.perf_counter()
+
+    async def run_one(entry):
+        try:
+            res = await dispatch(bot_module, entry, rtt)
+        except Exception as e:  # a crashing handler is a result too
+            res = None
+            results.append((entry["kind"], entry["command"], None, 0, repr(e)))
+        if res is not None:
+            results.append((entry["kind"], entry["command"], res[0], res[1], None))
+
+    tasks = []
+    for entry in trace:
+        if speed > 0:
+            delay = (entry["ts"] - t0) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(run_one(entry)))
+        else:
+            await run_one(entry)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(results):
+    """Per (kind, command): count, errors, p50/p95/p99/max latency in ms, mean round trips."""
+    groups = {}
+    for kind, command, latency, calls, error in results:
+        g = groups.setdefault(f"{kind}:{command}", {"lat": [], "calls": [], "errors": 0})
+        if error:
+            g["errors"] += 1
+        else:
+            g["lat"].append(latency * 1000.0)
+            g["calls"].append(calls)
+    summary = {}
+    for key, g in sorted(groups.items()):
+        lat = sorted(g["lat"])
+
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else float("nan")
+
+        summary[key] = {
+            "count": len(lat),
+            "errors": g["errors"],
+            "p50": median(lat) if lat else float("nan"),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": lat[-1] if lat else float("nan"),
+            "round_trips": sum(g["calls"]) / len(g["calls"]) if g["calls"] else 0.0,
+        }
+    return summary
+
+
+def run_tree(tree_dir, trace_path, speed, rtt, repeat):
+    os.environ.setdefault("GUILD_IDS", "1")
+    os.environ.pop("TRACE_FILE", None)
+    os.environ.pop("DISCORD_BOT_TOKEN", None)
+    tree_dir = os.path.abspath(tree_dir)
+    trace = load_trace(os.path.abspath(trace_path))
+    sys.path.insert(0, tree_dir)
+    # Handlers write presets etc. relative to cwd; keep those out of the tree.
+    os.chdir(tempfile.mkdtemp(prefix="replay-cwd-"))
+    import bot as bot_module
+
+    results = []
+    for _ in range(repeat):
+        results.extend(asyncio.run(replay(bot_module, trace, speed, rtt)))
+    return summarize(results)
+
+
+# ---------------------------
+# Version comparison
+# ---------------------------
+
+def checkout(rev):
+    """Return a directory holding `rev` ('.' = working tree)."""
+    if rev == ".":
+        return REPO_ROOT, None
+    tmp = tempfile.mkdtemp(prefix="replay-tree-")
+    archive = subprocess.run(["git", "-C", REPO_ROOT, "archive", rev],
+                             check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", tmp], input=archive, check=True)
+    return tmp, tmp
+
+
+def run_subprocess(tree_dir, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "run", tree_dir, args.trace,
+           "--speed", str(args.speed), "--rtt", str(args.rtt),
+           "--repeat", str(args.repeat), "--json"]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def print_summary(summary):
+    print(f"{'command':<28}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'trips':>7}")
+    for key, s in summary.items():
+        print(f"{key:<28}{s['count']:>6}{s['errors']:>5}{s['p50']:>10.3f}{s['p95']:>10.3f}"
+              f"{s['p99']:>10.3f}{s['max']:>10.3f}{s['round_trips']:>7.2f}")
+
+
+def print_comparison(base, cand, threshold):
+    """Print a side-by-side table; return the commands whose p95 regressed."""
+    regressions = []
+    print(f"{'command':<28}{'base p50':>10}{'cand p50':>10}{'base p95':>10}{'cand p95':>10}{'Δp95':>9}")
+    for key in sorted(set(base) | set(cand)):
+        b, c = base.get(key), cand.get(key)
+        if not b or not c:
+            print(f"{key:<28}  only in {'baseline' if b else 'candidate'}")
+            continue
+        change = (c["p95"] - b["p95"]) / b["p95"] * 100 if b["p95"] else 0.0
+        flag = ""
+        if change > threshold and c["p95"] - b["p95"] > 0.05:
+            flag = "  ⚠ regression"
+            regressions.append(key)
+        if c["errors"] > b["errors"]:
+            flag += f"  ⚠ {c['errors']} errors"
+            regressions.append(key)
+        print(f"{key:<28}{b['p50']:>10.3f}{c['p50']:>10.3f}{b['p95']:>10.3f}{c['p95']:>10.3f}"
+              f"{change:>+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay an interaction trace and compare handler latency.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    run_p = sub.add_parser("run", help="replay a trace against one tree")
+    run_p.add_argument("tree")
+    run_p.add_argument("trace")
+
+    cmp_p = sub.add_parser("compare", help="replay a trace against two versions")
+    cmp_p.add_argument("trace")
+    cmp_p.add_argument("--baseline", required=True, help="git rev, or '.' for the working tree")
+    cmp_p.add_argument("--candidate", default=".", help="git rev, or '.' for the working tree")
+    cmp_p.add_argument("--threshold", type=float, default=10.0,
+                       help="flag p95 increases above this many percent")
+
+    for p in (run_p, cmp_p):
+        p.add_argument("--speed", type=float, default=0.0,
+                       help="1 = recorded pace, N = N× faster, 0 = back-to-back")
+        p.add_argument("--rtt", type=float, default=0.0,
+                       help="simulated Discord round trip per response call, in ms")
+        p.add_argument("--repeat", type=int, default=1)
+    run_p.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.mode == "run":
+        summary = run_tree(args.tree, args.trace, args.speed, args.rtt / 1000.0, args.repeat)
+        if args.json:
+            print(json.dumps(summary))
+        else:
+            print_summary(summary)
+        return
+
+    args.trace = os.path.abspath(args.trace)
+    cleanup = []
+    try:
+        base_dir, tmp = checkout(args.baseline)
+        cleanup.append(tmp)
+        cand_dir, tmp = checkout(args.candidate)
+        cleanup.append(tmp)
+        base = run_subprocess(base_dir, args)
+        cand = run_subprocess(cand_dir, args)
+    finally:
+        for d in cleanup:
+            if d:
+                shutil.rmtree(d, ignore_errors=True)
+
+    print(f"baseline={args.baseline} candidate={args.candidate} speed={args.speed} rtt={args.rtt}ms\n")
+    regressions = print_comparison(base, cand, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(sorted(set(regressions)))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()